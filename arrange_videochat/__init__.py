@@ -0,0 +1 @@
+default_app_config = "arrange_videochat.apps.ArrangeVideoCharConfig"
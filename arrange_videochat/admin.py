@@ -2,14 +2,43 @@ from django.contrib import admin
 
 from modeltranslation.admin import TranslationAdmin
 
-from .models import Event, MailTemplate
+from .models import Event, MailTemplate, OutgoingMail, Participation, Reminder
+
+
+class ParticipationInline(admin.TabularInline):
+    model = Participation
+    extra = 0
+    raw_id_fields = ("user",)
+    readonly_fields = ("uuid",)
+
+
+class ReminderInline(admin.TabularInline):
+    """the reminders are scheduled from the start of the event and the
+    configured offsets, see Event.schedule_reminders()"""
+
+    model = Reminder
+    extra = 0
+    can_delete = False
+    readonly_fields = ("offset", "template_type", "due_at", "sent_at")
+
+    def has_add_permission(self, request, obj=None):
+        return False
 
 
 @admin.register(Event)
 class EventAdmin(admin.ModelAdmin):
-    list_display = ("uuid", "start", "language", "host")
+    list_display = ("uuid", "start", "language", "host", "seats_taken")
+    readonly_fields = ("seats_taken",)
+    inlines = (ParticipationInline, ReminderInline)
 
 
 @admin.register(MailTemplate)
 class MailTemplateAdmin(TranslationAdmin):
     list_display = ("type",)
+
+
+@admin.register(OutgoingMail)
+class OutgoingMailAdmin(admin.ModelAdmin):
+    list_display = ("to", "subject", "status", "attempts", "next_attempt_at")
+    list_filter = ("status",)
+    readonly_fields = ("created_at", "sent_at", "last_error")
@@ -0,0 +1,89 @@
+from django.conf import settings
+from django.http import JsonResponse, Http404
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.generic import View
+
+from .models import Event, create_absolute_url
+from .forms import EventFilter
+from .pagination import keyset_page
+from .cache import cached_response, api_list_key
+
+FIELDS = ("id", "start", "language", "tzname", "seats_taken", "free_seats", "full")
+
+
+def api_max_age() -> int:
+    """seconds clients and proxies may cache api responses, configurable by
+    settings.ARRANGE_VIDEOCHAT_API_MAX_AGE"""
+    return getattr(settings, "ARRANGE_VIDEOCHAT_API_MAX_AGE", 60)
+
+
+def serialize(event: dict) -> dict:
+    """the json representation of the values() of an event with availability"""
+    return {
+        "id": event["id"],
+        "start": event["start"].isoformat(),
+        "language": event["language"],
+        "timezone": event["tzname"],
+        "participants": event["seats_taken"] + 1,
+        "free_seats": event["free_seats"],
+        "full": event["full"],
+        "participate_url": create_absolute_url(
+            reverse("arrange_videochat:participate", args=[event["id"]])
+        ),
+    }
+
+
+def events():
+    return Event.objects.upcoming().with_availability().values(*FIELDS)
+
+
+class EventListApi(View):
+    """Upcoming events as json, paginated and filtered like the list"""
+
+    page_size = 50
+
+    def get(self, request, *args, **kwargs):
+        key = api_list_key(request.GET.urlencode())
+        response = cached_response(key, lambda: self.render_list(request))
+        patch_cache_control(response, public=True, max_age=api_max_age())
+        return response
+
+    def render_list(self, request):
+        """render a page and get how long it may be cached, which is until the
+        first event on it starts"""
+        queryset = EventFilter(request.GET).filter(events())
+        try:
+            page, next_cursor = keyset_page(
+                queryset, request.GET.get("after"), self.page_size
+            )
+        except ValueError:
+            return JsonResponse({"error": "Invalid cursor"}, status=400), 0
+
+        next_url = None
+        if next_cursor:
+            query = request.GET.copy()
+            query["after"] = next_cursor
+            next_url = f"{request.path}?{query.urlencode()}"
+
+        timeout = getattr(settings, "ARRANGE_VIDEOCHAT_EVENT_LIST_CACHE_TIMEOUT", 300)
+        if page:
+            until_start = (page[0]["start"] - timezone.now()).total_seconds()
+            timeout = min(timeout, int(until_start))
+
+        data = {"events": [serialize(event) for event in page], "next": next_url}
+        return JsonResponse(data), timeout
+
+
+class EventDetailApi(View):
+    """An upcoming event as json"""
+
+    def get(self, request, *args, **kwargs):
+        try:
+            event = events().get(pk=self.kwargs["pk"])
+        except Event.DoesNotExist:
+            raise Http404("No upcoming event found")
+        response = JsonResponse(serialize(event))
+        patch_cache_control(response, public=True, max_age=api_max_age())
+        return response
@@ -5,3 +5,7 @@ from django.utils.translation import ugettext_lazy as _
 class ArrangeVideoCharConfig(AppConfig):
     name = "arrange_videochat"
     verbose_name = _("Arrange Videochat")
+
+    def ready(self):
+        # pylint: disable=unused-import,import-outside-toplevel
+        from . import signals  # noqa: F401
@@ -0,0 +1,123 @@
+import time
+import uuid
+import hashlib
+import datetime
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+
+EVENT_LIST_VERSION_KEY = "arrange_videochat:event_list:version"
+EVENT_LIST_CHANGED_KEY = "arrange_videochat:event_list:changed"
+USERS_VERSION_KEY = "arrange_videochat:users:version"
+
+# seconds a stale page may still be served while another worker rebuilds it
+STALE_GRACE = 60
+# seconds after which a rebuild lock of a crashed worker is released
+REBUILD_LOCK_TIMEOUT = 30
+
+
+def get_cache():
+    """the cache used by arrange_videochat, configurable by
+    settings.ARRANGE_VIDEOCHAT_CACHE"""
+    return caches[getattr(settings, "ARRANGE_VIDEOCHAT_CACHE", "default")]
+
+
+def event_list_version() -> str:
+    """the current version of the event list, which changes on every
+    change of an event or participation"""
+    cache = get_cache()
+    version = cache.get(EVENT_LIST_VERSION_KEY)
+    if version is None:
+        cache.add(EVENT_LIST_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(EVENT_LIST_VERSION_KEY)
+    return version
+
+
+def event_list_changed_at() -> datetime.datetime:
+    """the time of the last change of the event list, or when the cache first
+    got asked for it"""
+    cache = get_cache()
+    cache.add(EVENT_LIST_CHANGED_KEY, time.time(), None)
+    changed = cache.get(EVENT_LIST_CHANGED_KEY, time.time())
+    return datetime.datetime.fromtimestamp(changed, tz=datetime.timezone.utc)
+
+
+def invalidate_event_list():
+    """invalidate all cached renderings of the event list"""
+    get_cache().set_many(
+        {EVENT_LIST_VERSION_KEY: uuid.uuid4().hex, EVENT_LIST_CHANGED_KEY: time.time()},
+        None,
+    )
+
+
+def users_version() -> str:
+    """the current version of the users, which changes when users are deleted"""
+    cache = get_cache()
+    version = cache.get(USERS_VERSION_KEY)
+    if version is None:
+        cache.add(USERS_VERSION_KEY, uuid.uuid4().hex, None)
+        version = cache.get(USERS_VERSION_KEY)
+    return version
+
+
+def invalidate_users():
+    """make all workers look up the users they resolved before again"""
+    get_cache().set(USERS_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def event_list_key(language: str, tzname: str, query: str) -> str:
+    """cache key of a rendered event list page"""
+    version = event_list_version()
+    query_hash = hashlib.md5(query.encode()).hexdigest()
+    return f"arrange_videochat:event_list:{version}:{language}:{tzname}:{query_hash}"
+
+
+def first_start_key(query: str) -> str:
+    """cache key of the start of the first upcoming event of a filtered list"""
+    version = event_list_version()
+    query_hash = hashlib.md5(query.encode()).hexdigest()
+    return f"arrange_videochat:event_list:{version}:first_start:{query_hash}"
+
+
+def api_list_key(query: str) -> str:
+    """cache key of a page of the event list api"""
+    version = event_list_version()
+    query_hash = hashlib.md5(query.encode()).hexdigest()
+    return f"arrange_videochat:api:event_list:{version}:{query_hash}"
+
+
+def cached_response(key: str, render):
+    """serve a response from the cache or render and cache it
+
+    render() has to return a rendered response and the number of seconds it is
+    valid for. An expired entry is kept for a short grace period and served
+    while a single worker (the one holding the rebuild lock) renders it again."""
+    cache = get_cache()
+    entry = cache.get(key)
+    if entry and entry["fresh_until"] > time.time():
+        return response_from_entry(entry)
+
+    lock_key = f"{key}:lock"
+    if not cache.add(lock_key, 1, REBUILD_LOCK_TIMEOUT):
+        if entry:
+            return response_from_entry(entry)
+        # nothing to serve yet, render without caching
+        return render()[0]
+
+    try:
+        response, timeout = render()
+        if response.status_code == 200 and timeout > 0:
+            entry = {
+                "content": response.content,
+                "content_type": response["Content-Type"],
+                "fresh_until": time.time() + timeout,
+            }
+            cache.set(key, entry, timeout + STALE_GRACE)
+        return response
+    finally:
+        cache.delete(lock_key)
+
+
+def response_from_entry(entry: dict) -> HttpResponse:
+    return HttpResponse(entry["content"], content_type=entry["content_type"])
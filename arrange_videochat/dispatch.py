@@ -0,0 +1,96 @@
+import queue
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager
+
+from django.core import mail
+from django.utils import timezone
+
+from .models import Event, Reminder
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionPool:
+    """A bounded number of mail connections, each opened on first use and
+    kept open for the following messages"""
+
+    def __init__(self, size: int):
+        self.connections = queue.Queue()
+        for _ in range(size):
+            self.connections.put(mail.get_connection())
+
+    @contextmanager
+    def connection(self):
+        """borrow a connection, which is reset if sending over it failed"""
+        connection = self.connections.get()
+        try:
+            connection.open()
+            yield connection
+        except Exception:
+            connection.close()
+            raise
+        finally:
+            self.connections.put(connection)
+
+    def send(self, messages: list) -> int:
+        with self.connection() as connection:
+            return connection.send_messages(messages) or 0
+
+    def close(self):
+        while not self.connections.empty():
+            self.connections.get().close()
+
+
+def dispatch_reminders(reminders, workers: int = 1) -> tuple:
+    """send the reminders to the participants of their events with a pool of
+    workers
+
+    Mails are rendered and reminders are marked as sent in the calling thread,
+    the workers only talk to the mail server, each over its own connection
+    that is reused across events. A reminder that could not be rendered or sent
+    is logged and released, so it is retried by the next run. Returns the
+    numbers of sent and failed reminders."""
+    pool = ConnectionPool(workers)
+    sent = failed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {}
+            for reminder in reminders:
+                try:
+                    messages = reminder.event.participant_mails(reminder.template_type)
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Could not render reminder %s", reminder.pk)
+                    release(reminder)
+                    failed += 1
+                    continue
+                if messages:
+                    futures[executor.submit(pool.send, messages)] = reminder
+                else:
+                    mark_sent(reminder)
+                    sent += 1
+
+            for future in as_completed(futures):
+                reminder = futures[future]
+                try:
+                    future.result()
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception("Could not send reminder %s", reminder.pk)
+                    release(reminder)
+                    failed += 1
+                else:
+                    mark_sent(reminder)
+                    sent += 1
+    finally:
+        pool.close()
+    return sent, failed
+
+
+def release(reminder: Reminder):
+    """release the claim, so the next run retries the reminder"""
+    Reminder.objects.filter(pk=reminder.pk).update(claimed_until=None)
+
+
+def mark_sent(reminder: Reminder):
+    Reminder.objects.filter(pk=reminder.pk).update(sent_at=timezone.now())
+    Event.objects.filter(pk=reminder.event_id).update(mails_sent=True)
@@ -1,3 +1,5 @@
+import datetime
+
 from django import forms
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
@@ -55,3 +57,39 @@ class Participate(forms.Form):
 
     class Meta:
         fields = ["email"]
+
+
+class EventFilter(forms.Form):
+    """Filters for the list of upcoming events"""
+
+    language = forms.ChoiceField(
+        label=_("Language"),
+        choices=(("", _("All languages")),) + tuple(settings.LANGUAGES),
+        required=False,
+    )
+    date_from = forms.DateField(label=_("From"), required=False)
+    date_to = forms.DateField(label=_("Until"), required=False)
+
+    def filter(self, queryset):
+        """apply the valid filters to a queryset of events
+
+        the date window is a range on start, so it uses its index"""
+        self.is_valid()
+        language = self.cleaned_data.get("language")
+        date_from = self.cleaned_data.get("date_from")
+        date_to = self.cleaned_data.get("date_to")
+
+        if language:
+            queryset = queryset.filter(language=language)
+        if date_from:
+            queryset = queryset.filter(start__gte=start_of_day(date_from))
+        if date_to:
+            queryset = queryset.filter(
+                start__lt=start_of_day(date_to + datetime.timedelta(days=1))
+            )
+        return queryset
+
+
+def start_of_day(date: datetime.date) -> datetime.datetime:
+    """midnight of the date in the current timezone"""
+    return timezone.make_aware(datetime.datetime.combine(date, datetime.time.min))
@@ -0,0 +1,104 @@
+import datetime
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils import translation
+from django.utils.translation import gettext
+
+PRODID = "-//CoronaCircles//arrange_videochat//EN"
+FOOTER = "END:VCALENDAR\r\n"
+
+# events have no end, calendars show them with this duration
+EVENT_DURATION = datetime.timedelta(hours=1)
+
+
+def escape_text(value: str) -> str:
+    """escape a TEXT value (RFC 5545, 3.3.11)"""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(";", "\\;")
+        .replace(",", "\\,")
+        .replace("\n", "\\n")
+    )
+
+
+def format_datetime(value: datetime.datetime) -> str:
+    """a DATE-TIME value in UTC (RFC 5545, 3.3.5)"""
+    return value.astimezone(datetime.timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+
+
+def fold(line: str) -> str:
+    """fold a content line after 75 octets (RFC 5545, 3.1)"""
+    encoded = line.encode()
+    if len(encoded) <= 75:
+        return line
+    parts = []
+    while encoded:
+        limit = 75 if not parts else 74
+        # do not split multi-byte characters
+        while limit < len(encoded) and (encoded[limit] & 0xC0) == 0x80:
+            limit -= 1
+        parts.append(encoded[:limit].decode())
+        encoded = encoded[limit:]
+    return "\r\n ".join(parts)
+
+
+def lines_to_str(lines: list) -> str:
+    return "".join(fold(line) + "\r\n" for line in lines)
+
+
+def header(tzname: str = None) -> str:
+    lines = [
+        "BEGIN:VCALENDAR",
+        "VERSION:2.0",
+        f"PRODID:{PRODID}",
+        "CALSCALE:GREGORIAN",
+        "METHOD:PUBLISH",
+    ]
+    if tzname:
+        lines.append(f"X-WR-TIMEZONE:{tzname}")
+    return lines_to_str(lines)
+
+
+@lru_cache(maxsize=1024)
+def vevent(uid, start, created_at, language, url) -> str:
+    """the VEVENT component of an event"""
+    with translation.override(language):
+        summary = gettext("Video Chat")
+    domain = settings.ALLOWED_HOSTS[0]
+    return lines_to_str(
+        [
+            "BEGIN:VEVENT",
+            f"UID:{uid}@{domain}",
+            f"DTSTAMP:{format_datetime(created_at)}",
+            f"DTSTART:{format_datetime(start)}",
+            f"DTEND:{format_datetime(start + EVENT_DURATION)}",
+            f"SUMMARY:{escape_text(summary)}",
+            f"URL:{url}",
+            "END:VEVENT",
+        ]
+    )
+
+
+def event_vevent(event) -> str:
+    return vevent(
+        str(event.uuid), event.start, event.created_at, event.language, event.join_url
+    )
+
+
+def serialize(event) -> bytes:
+    """a VCALENDAR with a VEVENT of the event, the serialization is cached"""
+    return calendar(event_vevent(event), event.tzname)
+
+
+@lru_cache(maxsize=1024)
+def calendar(vevent: str, tzname: str) -> bytes:
+    return (header(tzname) + vevent + FOOTER).encode()
+
+
+def stream(events):
+    """a VCALENDAR of the events, serialized one after another"""
+    yield header().encode()
+    for event in events:
+        yield event_vevent(event).encode()
+    yield FOOTER.encode()
@@ -1,21 +1,74 @@
+import time
+
 from django.core.management.base import BaseCommand
 
-from arrange_videochat.models import Event
+from arrange_videochat.models import Event, Reminder
+from arrange_videochat.dispatch import dispatch_reminders
+from arrange_videochat.outbox import send_queued_mails
+from arrange_videochat.users import delete_orphaned_users
 
 
 class Command(BaseCommand):
     help = "Mail the participants of events that are about to start (best run via cron every 5 minutes)"
 
-    def mail_participants(self):
-        print("Mailing participants")
-        for event in Event.objects.to_be_mailed():
-            event.mail_participants()
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of mail server connections used in parallel",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Number of old events or orphaned users deleted per statement",
+        )
+        parser.add_argument(
+            "--users-dry-run",
+            action="store_true",
+            help="Only count the orphaned users instead of deleting them",
+        )
+
+    def send_reminders(self, workers):
+        self.stdout.write("Sending reminders")
+        sent, failed = dispatch_reminders(
+            Reminder.objects.due().claim().select_related("event__host"), workers
+        )
+        self.stdout.write(f"Sent {sent} reminders, {failed} failed")
+
+    def delete_old_events(self, batch_size):
+        self.stdout.write("Deleting old events")
+        started = time.monotonic()
+        events, dependents = Event.objects.to_be_deleted().delete_in_batches(batch_size)
+        duration = time.monotonic() - started
+        rows = events + dependents
+        self.stdout.write(
+            f"Deleted {events} events and {dependents} related rows "
+            f"in {duration:.2f}s ({rows / max(duration, 1e-6):.0f} rows/s)"
+        )
+
+    def delete_orphaned_users(self, batch_size, dry_run):
+        if dry_run:
+            users = delete_orphaned_users(dry_run=True)
+            self.stdout.write(f"Would delete {users} orphaned users")
+            return
+
+        self.stdout.write("Deleting orphaned users")
+        started = time.monotonic()
+        users = delete_orphaned_users(batch_size)
+        duration = time.monotonic() - started
+        self.stdout.write(
+            f"Deleted {users} orphaned users "
+            f"in {duration:.2f}s ({users / max(duration, 1e-6):.0f} users/s)"
+        )
 
-    def delete_old_events(self):
-        print("Deleting old events")
-        for event in Event.objects.to_be_deleted():
-            event.delete()
+    def send_mail_queue(self):
+        self.stdout.write("Sending queued mails")
+        send_queued_mails()
 
     def handle(self, *args, **options):
-        self.mail_participants()
-        self.delete_old_events()
+        self.send_reminders(options["workers"])
+        self.delete_old_events(options["batch_size"])
+        self.delete_orphaned_users(options["batch_size"], options["users_dry_run"])
+        self.send_mail_queue()
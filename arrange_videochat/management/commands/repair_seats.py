@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from arrange_videochat.models import Event
+
+
+class Command(BaseCommand):
+    help = "Recompute the seat counters of all events from their participations"
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            drifted = Event.objects.repair_seats_taken()
+        self.stdout.write(f"Repaired seat counters of {drifted} events")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from arrange_videochat.scheduler import Scheduler
+
+
+class Command(BaseCommand):
+    help = "Mail the participants of events when they are due (runs until stopped)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of mail server connections used in parallel",
+        )
+        parser.add_argument(
+            "--poll-interval",
+            type=int,
+            default=5,
+            help="Seconds between checks for changed events",
+        )
+        parser.add_argument(
+            "--resync-interval",
+            type=int,
+            default=300,
+            help="Seconds after which all events are reloaded",
+        )
+
+    def handle(self, *args, **options):
+        scheduler = Scheduler(
+            workers=options["workers"],
+            poll_interval=options["poll_interval"],
+            resync_interval=options["resync_interval"],
+        )
+        self.stdout.write("Scheduler started")
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            self.stdout.write("Scheduler stopped")
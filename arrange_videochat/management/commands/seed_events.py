@@ -0,0 +1,100 @@
+import uuid
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from arrange_videochat.cache import invalidate_event_list
+from arrange_videochat.models import (
+    Event,
+    Participation,
+    Reminder,
+    scheduled_reminders,
+)
+from arrange_videochat.users import User
+
+
+class Command(BaseCommand):
+    help = "Create events with participants as test data, e.g. for benchmarks"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--events", type=int, default=100, help="Number of events to create"
+        )
+        parser.add_argument(
+            "--participants",
+            type=int,
+            default=2,
+            help="Number of participants of each event, excluding the host",
+        )
+        parser.add_argument(
+            "--starts-in",
+            type=int,
+            default=24 * 60,
+            help="Minutes until the first event starts, the others follow a second apart",
+        )
+        parser.add_argument("--language", default="en", help="Language of the events")
+
+    def handle(self, *args, **options):
+        events, participants = options["events"], options["participants"]
+        if not 0 <= participants < Event.max_participants:
+            raise CommandError(
+                f"An event has at most {Event.max_participants - 1} participants"
+            )
+
+        # unique addresses, so the command can run several times
+        prefix = uuid.uuid4().hex[:8]
+        first_start = timezone.now() + datetime.timedelta(minutes=options["starts_in"])
+
+        with transaction.atomic():
+            # the rows are read back as bulk_create does not set the primary
+            # keys on every database
+            User.objects.bulk_create(
+                User(
+                    username=f"{prefix}-{i}@example.com",
+                    email=f"{prefix}-{i}@example.com",
+                )
+                for i in range(events * (participants + 1))
+            )
+            users = list(
+                User.objects.filter(username__startswith=f"{prefix}-").order_by("pk")
+            )
+
+            Event.objects.bulk_create(
+                Event(
+                    host=users[i * (participants + 1)],
+                    start=first_start + datetime.timedelta(seconds=i),
+                    language=options["language"],
+                    seats_taken=participants,
+                )
+                for i in range(events)
+            )
+            created = Event.objects.filter(host__username__startswith=f"{prefix}-")
+            created = list(created.order_by("start"))
+
+            Participation.objects.bulk_create(
+                Participation(event=event, user=users[i * (participants + 1) + j])
+                for i, event in enumerate(created)
+                for j in range(1, participants + 1)
+            )
+            # the reminders Event.schedule_reminders() would create
+            now = timezone.now()
+            Reminder.objects.bulk_create(
+                Reminder(
+                    event=event,
+                    offset=offset,
+                    template_type=template_type,
+                    due_at=due_at,
+                )
+                for event in created
+                for offset, template_type, due_at in scheduled_reminders(
+                    event.start, now
+                )
+            )
+
+        # bulk_create sends no signals
+        invalidate_event_list()
+        self.stdout.write(
+            f"Created {events} events with {participants} participants each"
+        )
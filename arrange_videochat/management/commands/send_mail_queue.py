@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from arrange_videochat.outbox import send_queued_mails
+
+
+class Command(BaseCommand):
+    help = "Send the queued mails (best run every minute, e.g. via cron)"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=100,
+            help="Number of mails sent over one connection",
+        )
+
+    def handle(self, *args, **options):
+        sent, failed = send_queued_mails(batch_size=options["batch_size"])
+        self.stdout.write(f"Sent {sent} mails, {failed} failed")
@@ -1,7 +1,18 @@
+import time
+import logging
+import functools
+import contextlib
+import contextvars
 import pytz
 
 from django.utils import timezone
+from django.utils.module_loading import import_string
 from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Template
+
+logger = logging.getLogger(__name__)
 
 
 class TimezoneMiddleware:
@@ -15,3 +26,149 @@ class TimezoneMiddleware:
         tzname = settings.TIME_ZONES_BY_LANG.get(language_code, settings.TIME_ZONE)
         timezone.activate(pytz.timezone(tzname))
         return self.get_response(request)
+
+
+# timings of the request handled in the current thread or task
+request_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+class Timings:
+    """durations in seconds collected during a request"""
+
+    def __init__(self):
+        self.queries = []
+        self.db = 0.0
+        self.template = 0.0
+        self.mail = 0.0
+        self.rendering = False
+
+    def execute(self, execute, sql, params, many, context):
+        """execute_wrapper() that times every query"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            self.db += duration
+            self.queries.append((duration, sql))
+
+
+def timed_render(render):
+    """wrap Template.render to add its duration to the current request, nested
+    renderings (e.g. includes) are part of the outermost one"""
+
+    @functools.wraps(render)
+    def wrapper(self, *args, **kwargs):
+        timings = request_timings.get()
+        if timings is None or timings.rendering:
+            return render(self, *args, **kwargs)
+        timings.rendering = True
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            timings.template += time.perf_counter() - started
+            timings.rendering = False
+
+    return wrapper
+
+
+def timed_send(send_messages):
+    """wrap send_messages of a mail backend to add its duration to the current
+    request"""
+
+    @functools.wraps(send_messages)
+    def wrapper(self, *args, **kwargs):
+        timings = request_timings.get()
+        started = time.perf_counter()
+        try:
+            return send_messages(self, *args, **kwargs)
+        finally:
+            if timings is not None:
+                timings.mail += time.perf_counter() - started
+
+    return wrapper
+
+
+@functools.lru_cache(maxsize=None)
+def instrument_templates():
+    """time template rendering, once per process and only if the middleware is
+    used"""
+    Template.render = timed_render(Template.render)
+
+
+@functools.lru_cache(maxsize=None)
+def instrument_mail(backend_path: str):
+    """time sending mails with a backend, once per process and backend"""
+    backend = import_string(backend_path)
+    backend.send_messages = timed_send(backend.send_messages)
+
+
+class InstrumentationMiddleware:
+    """Measures the database queries, template rendering and mail sending of
+    each request
+
+    Only used if settings.ARRANGE_VIDEOCHAT_INSTRUMENTATION is set. The timings
+    are sent in a Server-Timing header and logged, requests taking longer than
+    settings.ARRANGE_VIDEOCHAT_SLOW_REQUEST seconds (default: 1) are logged
+    with their queries."""
+
+    def __init__(self, get_response):
+        if not getattr(settings, "ARRANGE_VIDEOCHAT_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_request = getattr(settings, "ARRANGE_VIDEOCHAT_SLOW_REQUEST", 1.0)
+        instrument_templates()
+        instrument_mail(settings.EMAIL_BACKEND)
+
+    def __call__(self, request):
+        timings = Timings()
+        token = request_timings.set(timings)
+        started = time.perf_counter()
+        try:
+            with contextlib.ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timings.execute))
+                response = self.get_response(request)
+        finally:
+            request_timings.reset(token)
+        total = time.perf_counter() - started
+
+        response["Server-Timing"] = ", ".join(
+            [
+                f'db;dur={timings.db * 1000:.1f};desc="{len(timings.queries)} queries"',
+                f"template;dur={timings.template * 1000:.1f}",
+                f"mail;dur={timings.mail * 1000:.1f}",
+                f"total;dur={total * 1000:.1f}",
+            ]
+        )
+        self.log(request, response, timings, total)
+        return response
+
+    def log(self, request, response, timings, total):
+        fields = {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round(total * 1000, 1),
+            "queries": len(timings.queries),
+            "db_ms": round(timings.db * 1000, 1),
+            "template_ms": round(timings.template * 1000, 1),
+            "mail_ms": round(timings.mail * 1000, 1),
+        }
+        message = " ".join(f"{key}={value}" for key, value in fields.items())
+        logger.info(message, extra={"request_timings": fields})
+
+        if total >= self.slow_request:
+            queries = "\n".join(
+                f"{duration * 1000:.1f} ms: {sql}" for duration, sql in timings.queries
+            )
+            logger.warning(
+                "Slow request %s %s took %.1f ms with %d queries:\n%s",
+                request.method,
+                request.path,
+                total * 1000,
+                len(timings.queries),
+                queries,
+                extra={"request_timings": fields},
+            )
@@ -0,0 +1,29 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:42
+
+from django.db import migrations, models
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arrange_videochat', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='event',
+            name='start',
+            field=models.DateTimeField(db_index=True, verbose_name='Date and Time'),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, unique=True, verbose_name='UUID for meeting-URL'),
+        ),
+        migrations.AlterField(
+            model_name='participation',
+            name='uuid',
+            field=models.UUIDField(default=uuid.uuid4, unique=True),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:43
+
+from django.db import migrations, models
+
+
+def count_seats(apps, schema_editor):
+    """remove duplicate participations and initialize the seat counters"""
+    Event = apps.get_model("arrange_videochat", "Event")
+    Participation = apps.get_model("arrange_videochat", "Participation")
+
+    seen = set()
+    for pk, event_id, user_id in Participation.objects.order_by("pk").values_list(
+        "pk", "event_id", "user_id"
+    ):
+        if (event_id, user_id) in seen:
+            Participation.objects.filter(pk=pk).delete()
+        seen.add((event_id, user_id))
+
+    for event in Event.objects.annotate(count=models.Count("participation")):
+        Event.objects.filter(pk=event.pk).update(seats_taken=event.count)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arrange_videochat', '0002_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='seats_taken',
+            field=models.PositiveSmallIntegerField(default=0, editable=False, verbose_name='Number of reserved seats (excluding host)'),
+        ),
+        migrations.RunPython(count_seats, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='participation',
+            constraint=models.UniqueConstraint(fields=('event', 'user'), name='unique_participation'),
+        ),
+    ]
@@ -0,0 +1,72 @@
+# Generated by Django 3.0.14 on 2026-10-17 00:58
+
+import datetime
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def schedule_reminders(apps, schema_editor):
+    """create the reminders of the events that have not been mailed yet"""
+    Event = apps.get_model("arrange_videochat", "Event")
+    Reminder = apps.get_model("arrange_videochat", "Reminder")
+
+    offsets = getattr(
+        settings, "ARRANGE_VIDEOCHAT_REMINDERS", [(datetime.timedelta(hours=1), "join")]
+    )
+    now = timezone.now()
+    reminders = []
+    for pk, start in Event.objects.filter(mails_sent=False).values_list("pk", "start"):
+        # of the reminders that are due only the last one is sent
+        last_due = min(
+            (offset for offset, _ in offsets if start - offset <= now), default=None
+        )
+        for offset, template_type in offsets:
+            due_at = start - offset
+            if due_at > now or offset == last_due:
+                reminders.append(
+                    Reminder(
+                        event_id=pk,
+                        offset=offset,
+                        template_type=template_type,
+                        due_at=due_at,
+                    )
+                )
+    Reminder.objects.bulk_create(reminders, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arrange_videochat', '0004_outgoing_mail'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Reminder',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('offset', models.DurationField(verbose_name='Time before the start')),
+                ('template_type', models.CharField(max_length=255, verbose_name='Mail template type')),
+                ('due_at', models.DateTimeField(verbose_name='Due at')),
+                ('sent_at', models.DateTimeField(blank=True, null=True, verbose_name='Sent at')),
+                ('claimed_until', models.DateTimeField(editable=False, null=True)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminders', to='arrange_videochat.Event')),
+            ],
+            options={
+                'verbose_name': 'Reminder',
+                'verbose_name_plural': 'Reminders',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='reminder',
+            index=models.Index(fields=['due_at', 'sent_at'], name='arrange_vid_due_at_090046_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='reminder',
+            constraint=models.UniqueConstraint(fields=('event', 'offset', 'template_type'), name='unique_reminder'),
+        ),
+        migrations.RunPython(schedule_reminders, migrations.RunPython.noop),
+    ]
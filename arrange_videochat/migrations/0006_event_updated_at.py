@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-17 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('arrange_videochat', '0005_reminders'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='event',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, verbose_name='Last change'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.db import migrations
+from django.db.models import F
+
+
+def normalize_usernames(apps, schema_editor):
+    """lowercase the addresses of the users created by email, users whose
+    addresses only differ by case are merged into the first one"""
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    Event = apps.get_model("arrange_videochat", "Event")
+    Participation = apps.get_model("arrange_videochat", "Participation")
+
+    users = User.objects.filter(
+        is_staff=False, is_superuser=False, username__contains="@"
+    ).order_by("pk")
+    for pk, username in users.values_list("pk", "username"):
+        normalized = username.strip().lower()
+        if normalized == username:
+            continue
+        existing = User.objects.filter(username=normalized).first()
+        if existing is None:
+            User.objects.filter(pk=pk).update(username=normalized, email=normalized)
+            continue
+
+        Event.objects.filter(host_id=pk).update(host_id=existing.pk)
+        # both users joined these events, the seat of the duplicate is freed
+        joined_twice = Participation.objects.filter(
+            user_id=pk, event__participation__user_id=existing.pk
+        )
+        event_ids = list(joined_twice.values_list("event_id", flat=True))
+        Participation.objects.filter(user_id=pk, event_id__in=event_ids).delete()
+        Event.objects.filter(pk__in=event_ids).update(seats_taken=F("seats_taken") - 1)
+        Participation.objects.filter(user_id=pk).update(user_id=existing.pk)
+        User.objects.filter(pk=pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('arrange_videochat', '0006_event_updated_at'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_usernames, migrations.RunPython.noop),
+    ]
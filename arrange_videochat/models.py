@@ -1,9 +1,11 @@
 import uuid
+import hashlib
 import datetime
 import logging
 import pytz
 
-from django.db import models
+from django.db import models, transaction, connections, IntegrityError
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 from django.core import mail
@@ -13,13 +15,44 @@ from django.template import Template, Context
 from django.utils import translation
 from django.urls import reverse
 from django.template import TemplateSyntaxError
+from django.core.exceptions import ValidationError
 
-from icalendar import Calendar, Event as IEvent
+from . import ical
+from .cache import get_cache, invalidate_event_list
 
 logger = logging.getLogger(__name__)
 TIMEZONES = tuple(zip(pytz.common_timezones, pytz.common_timezones))
 User = get_user_model()
 
+# rendered in place of {{ leave_url }} and replaced per recipient afterwards
+LEAVE_URL_PLACEHOLDER = "leave-url-" + uuid.uuid4().hex
+
+
+def reminder_offsets() -> list:
+    """the reminders of each event as (time before the start, mail template
+    type), configurable by settings.ARRANGE_VIDEOCHAT_REMINDERS"""
+    return getattr(
+        settings, "ARRANGE_VIDEOCHAT_REMINDERS", [(datetime.timedelta(hours=1), "join")]
+    )
+
+
+def scheduled_reminders(start: datetime.datetime, now: datetime.datetime) -> list:
+    """the configured reminders of an event starting at start as (offset,
+    template type, due at)
+
+    Of the reminders that are already due only the one closest to the start is
+    kept, so an event created shortly before it starts does not get several
+    reminders at once."""
+    offsets = reminder_offsets()
+    last_due = min(
+        (offset for offset, _ in offsets if start - offset <= now), default=None
+    )
+    return [
+        (offset, template_type, start - offset)
+        for offset, template_type in offsets
+        if start - offset > now or offset == last_due
+    ]
+
 
 def create_absolute_url(path: str) -> str:
     """generates an absolute url from a path using settings.ALLOWED_HOSTS"""
@@ -32,25 +65,106 @@ class EventQuerySet(models.QuerySet):
         """events that are in the future"""
         return self.filter(start__gte=timezone.now())
 
-    def to_be_mailed(self):
-        """events that are to be mailed, because they start very soon"""
-        return self.filter(
-            mails_sent=False, start__lte=timezone.now() + datetime.timedelta(hours=1)
-        )
-
     def to_be_deleted(self):
         """events that are to be deleted, because they are old"""
         return self.filter(start__lte=timezone.now() - datetime.timedelta(days=1))
 
+    def with_participant_count(self):
+        """annotate the number of participation rows (excluding host) of each event
+
+        Event.seats_taken is the cheap way to read this, the annotation is used
+        to find and repair drift of that counter"""
+        return self.annotate(num_participants=models.Count("participation"))
+
+    def with_availability(self):
+        """annotate the number of free seats and whether each event is full"""
+        return self.annotate(
+            free_seats=Event.max_participants - 1 - models.F("seats_taken"),
+            full=models.Case(
+                models.When(
+                    seats_taken__gte=Event.max_participants - 1, then=models.Value(True)
+                ),
+                default=models.Value(False),
+                output_field=models.BooleanField(),
+            ),
+        )
+
+    def repair_seats_taken(self) -> int:
+        """recompute the seat counters from the participation rows in one
+        statement, returns the number of events that had drifted"""
+        drifted = (
+            self.with_participant_count()
+            .exclude(seats_taken=models.F("num_participants"))
+            .count()
+        )
+        if drifted:
+            counts = (
+                Participation.objects.filter(event=models.OuterRef("pk"))
+                .order_by()
+                .values("event")
+                .annotate(count=models.Count("pk"))
+                .values("count")
+            )
+            self.update(
+                seats_taken=Coalesce(
+                    models.Subquery(counts, output_field=models.IntegerField()), 0
+                ),
+                updated_at=timezone.now(),
+            )
+        return drifted
+
+    def delete_in_batches(self, batch_size: int = 1000) -> tuple:
+        """delete the events in batches by primary key range, without loading
+        them and with their dependent rows deleted in one statement per batch
+
+        Signals are not sent, the cascade only covers rows directly referencing
+        an event. Returns the numbers of deleted events and dependent rows."""
+        events = dependents = 0
+        pks = self.order_by("pk").values_list("pk", flat=True)
+        last = None
+        while True:
+            chunk = pks if last is None else pks.filter(pk__gt=last)
+            chunk = list(chunk[:batch_size])
+            if not chunk:
+                break
+            last = chunk[-1]
+
+            deleted = self.filter(pk__range=(chunk[0], last)).delete_raw()
+            events += deleted[0]
+            dependents += deleted[1]
+        return events, dependents
+
+    def delete_raw(self) -> tuple:
+        """delete the events and the rows directly referencing them with one
+        statement per table, without loading them or sending signals
+
+        Returns the numbers of deleted events and dependent rows."""
+        dependents = 0
+        with transaction.atomic(using=self.db):
+            for relation in self.model._meta.related_objects:
+                if relation.on_delete is not models.CASCADE:
+                    continue
+                related = relation.related_model._base_manager.using(self.db).filter(
+                    **{f"{relation.field.name}__in": self.values("pk")}
+                )
+                dependents += related._raw_delete(self.db)
+            events = self._raw_delete(self.db)
+
+        if events:
+            transaction.on_commit(invalidate_event_list, using=self.db)
+        return events, dependents
+
 
 class EventManager(models.Manager.from_queryset(EventQuerySet)):
     pass
 
 
 class Event(models.Model):
-    uuid = models.UUIDField(_("UUID for meeting-URL"), default=uuid.uuid4)
+    uuid = models.UUIDField(_("UUID for meeting-URL"), default=uuid.uuid4, unique=True)
     created_at = models.DateTimeField(_("Creation Date"), default=timezone.now)
-    start = models.DateTimeField(_("Date and Time"))
+    # bumped by every change of the event and its participations
+    updated_at = models.DateTimeField(_("Last change"), auto_now=True)
+    start = models.DateTimeField(_("Date and Time"), db_index=True)
     language = models.CharField(
         _("Language"), max_length=10, choices=settings.LANGUAGES, default="en"
     )
@@ -59,6 +173,9 @@ class Event(models.Model):
     )
 
     mails_sent = models.BooleanField(_("If e-mail has been sent"), default=False)
+    seats_taken = models.PositiveSmallIntegerField(
+        _("Number of reserved seats (excluding host)"), default=0, editable=False
+    )
 
     host = models.ForeignKey(
         User,
@@ -73,12 +190,15 @@ class Event(models.Model):
         through="Participation",
     )
 
+    # maximum number of participants including host
+    max_participants = 5
+
     objects = EventManager()
 
     @property
     def is_full(self) -> bool:
         """determines wether event is already full (4 participants, 5 including host)"""
-        return self.participant_count >= 5
+        return self.participant_count >= self.max_participants
 
     @property
     def is_past(self) -> bool:
@@ -87,8 +207,10 @@ class Event(models.Model):
 
     @property
     def participant_count(self) -> int:
-        """current number of participants including host"""
-        return self.participants.count() + 1
+        """current number of participants including host
+
+        read from the seat counter, which is kept up to date by signals"""
+        return self.seats_taken + 1
 
     @property
     def join_url(self) -> str:
@@ -110,14 +232,9 @@ class Event(models.Model):
         )
 
     @property
-    def ical(self) -> Calendar:
+    def ical(self) -> bytes:
         """Get ical representation of event"""
-        cal = Calendar()
-        event = IEvent()
-        event.add("summary", "Video Chat")
-        event.add("dtstart", self.start)
-        cal.add_component(event)
-        return cal.to_ical()
+        return ical.serialize(self)
 
     @property
     def display_tzname(self):
@@ -130,26 +247,132 @@ class Event(models.Model):
             "start_date": self.start.strftime("%x %X")
         }
 
-    def mail_participants(self, template_type="join"):
-        """Sends mails to all participants including host with the join url
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        event = super().from_db(db, field_names, values)
+        event.saved_start = event.__dict__.get("start")
+        return event
+
+    def save(self, *args, **kwargs):
+        """save the event without overwriting the seat counter
+
+        seats_taken is only changed with F-expressions, the value on this
+        instance is refreshed instead. The reminders are scheduled when the
+        event is created or its start changes."""
+        if not self._state.adding and "update_fields" not in kwargs:
+            kwargs["update_fields"] = [
+                field.name
+                for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != "seats_taken"
+            ]
+            super().save(*args, **kwargs)
+            self.refresh_from_db(fields=["seats_taken"])
+        else:
+            super().save(*args, **kwargs)
+
+        if self.start != getattr(self, "saved_start", None):
+            self.schedule_reminders()
+            self.saved_start = self.start
+
+    def schedule_reminders(self):
+        """create the configured reminders of the event and move the unsent
+        ones along with its start
+
+        see scheduled_reminders()"""
+        now = timezone.now()
+        existing = {
+            (reminder.offset, reminder.template_type): reminder
+            for reminder in self.reminders.all()
+        }
 
-        uses the events language for the mail templates"""
-        addrs = [p.email for p in self.participants.all()] + [self.host.email]
-
-        with mail.get_connection() as connection:
-            with translation.override(self.language):
-                for addr in addrs:
-                    email = MailTemplate.get_mail(
-                        type=template_type,
-                        context={"event": self},
-                        to_email=addr,
-                        connection=connection,
+        new = []
+        for offset, template_type, due_at in scheduled_reminders(self.start, now):
+            reminder = existing.pop((offset, template_type), None)
+            if reminder is None:
+                new.append(
+                    Reminder(
+                        event=self,
+                        offset=offset,
+                        template_type=template_type,
+                        due_at=due_at,
                     )
-                    if email:
-                        email.send(fail_silently=True)
+                )
+            elif reminder.due_at != due_at:
+                reminder.due_at = due_at
+                if due_at > now:
+                    reminder.sent_at = None
+                reminder.save(update_fields=["due_at", "sent_at"])
+        Reminder.objects.bulk_create(new)
+
+        # not configured anymore or skipped
+        unsent = [reminder.pk for reminder in existing.values() if not reminder.sent_at]
+        if unsent:
+            Reminder.objects.filter(pk__in=unsent).delete()
+
+    def mail_participants(self, template_type="join", connection=None) -> int:
+        """Sends mails to all participants including host with the join url
+
+        uses the events language for the mail templates. The template is
+        rendered once, only the leave url is filled in per participant and all
+        mails are sent over a single connection. Returns the number of sent
+        mails."""
+        messages = self.participant_mails(template_type, connection=connection)
+        if messages:
+            own_connection = connection is None
+            if own_connection:
+                connection = mail.get_connection(fail_silently=True)
+            try:
+                sent = connection.send_messages(messages) or 0
+            finally:
+                if own_connection:
+                    connection.close()
+            if sent < len(messages):
+                logger.error(
+                    "Sent only %d of %d mails of event %s", sent, len(messages), self.pk
+                )
+        else:
+            sent = 0
 
         self.mails_sent = True
         self.save()
+        return sent
+
+    def participant_mails(self, template_type="join", connection=None) -> list:
+        """render the mails of type template_type to all participants and the
+        host, which gets no leave url"""
+        recipients = [
+            (email, create_absolute_url(reverse("arrange_videochat:leave", args=[pk])))
+            for email, pk in self.participation_set.values_list("user__email", "uuid")
+        ]
+
+        with translation.override(self.language):
+            # rendered on its own, templates may test {% if leave_url %}
+            host_message = MailTemplate.get_mail(
+                type=template_type,
+                context={"event": self},
+                to_email=self.host.email,
+                connection=connection,
+            )
+            if host_message is None:
+                return []
+            if recipients:
+                message = MailTemplate.get_mail(
+                    type=template_type,
+                    context={"event": self, "leave_url": LEAVE_URL_PLACEHOLDER},
+                    to_email=self.host.email,
+                    connection=connection,
+                )
+
+        return [
+            mail.EmailMessage(
+                subject=message.subject.replace(LEAVE_URL_PLACEHOLDER, leave_url),
+                body=message.body.replace(LEAVE_URL_PLACEHOLDER, leave_url),
+                from_email=message.from_email,
+                to=[email],
+                connection=connection,
+            )
+            for email, leave_url in recipients
+        ] + [host_message]
 
     class Meta:
         ordering = ("start",)
@@ -157,12 +380,55 @@ class Event(models.Model):
         verbose_name_plural = _("Events")
 
 
+class ParticipationManager(models.Manager):
+    def reserve(self, event: Event, user, participation_uuid=None) -> "Participation":
+        """reserve a seat on the event for the user
+
+        The seat is claimed with a conditional UPDATE on the seat counter of the
+        event, so concurrent joiners can not overbook it. Only the row of this
+        event is locked and only for the duration of the transaction. A new
+        participation gets participation_uuid if given, e.g. the one of a leave
+        url rendered before.
+        Returns the participation or None if the event is full."""
+        try:
+            with transaction.atomic():
+                claimed = Event.objects.filter(
+                    pk=event.pk, seats_taken__lt=event.max_participants - 1
+                ).update(
+                    seats_taken=models.F("seats_taken") + 1, updated_at=timezone.now()
+                )
+                if not claimed:
+                    return self.filter(event=event, user=user).first()
+
+                participation = self.filter(event=event, user=user).first()
+                if participation:
+                    # already participating, give the seat back
+                    Event.objects.filter(pk=event.pk).update(
+                        seats_taken=models.F("seats_taken") - 1,
+                        updated_at=timezone.now(),
+                    )
+                    return participation
+
+                participation = self.model(event=event, user=user)
+                if participation_uuid:
+                    participation.uuid = participation_uuid
+                # the seat is already counted, see signals.participation_saved
+                participation.seat_reserved = True
+                participation.save(force_insert=True)
+                return participation
+        except IntegrityError:
+            # a concurrent request of the same user won the race
+            return self.get(event=event, user=user)
+
+
 class Participation(models.Model):
     """Saves the participation of a user on an event"""
 
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     event = models.ForeignKey(Event, on_delete=models.CASCADE)
-    uuid = models.UUIDField(default=uuid.uuid4)
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True)
+
+    objects = ParticipationManager()
 
     @property
     def leave_url(self):
@@ -173,15 +439,114 @@ class Participation(models.Model):
         return f"{self.user} {self.event}"
 
     class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "user"], name="unique_participation"
+            )
+        ]
         verbose_name = _("Participation")
         verbose_name_plural = _("Participations")
 
 
-def render_template(template: str, context: dict) -> str:
-    """helper to render a template str with context"""
+class ReminderQuerySet(models.QuerySet):
+    def due(self):
+        """unsent reminders that are due, a range scan of the (due_at, sent_at)
+        index"""
+        return self.filter(due_at__lte=timezone.now(), sent_at__isnull=True)
+
+    def claim(self, lease: int = None):
+        """take the reminders for sending until the lease (in seconds,
+        settings.ARRANGE_VIDEOCHAT_MAIL_LEASE) expires
+
+        Reminders claimed by another worker are skipped, so the same reminder
+        is not sent by several hosts. Uses SELECT ... FOR UPDATE SKIP LOCKED
+        where supported and a conditional update per reminder otherwise.
+        Returns the claimed reminders."""
+        if lease is None:
+            lease = getattr(settings, "ARRANGE_VIDEOCHAT_MAIL_LEASE", 300)
+        now = timezone.now()
+        claimed_until = now + datetime.timedelta(seconds=lease)
+        claimable = self.filter(
+            models.Q(claimed_until__isnull=True) | models.Q(claimed_until__lt=now)
+        )
+
+        if connections[self.db].features.has_select_for_update_skip_locked:
+            with transaction.atomic(using=self.db):
+                pks = list(
+                    claimable.select_for_update(skip_locked=True).values_list(
+                        "pk", flat=True
+                    )
+                )
+                claimable.filter(pk__in=pks).update(claimed_until=claimed_until)
+        else:
+            pks = [
+                pk
+                for pk in claimable.values_list("pk", flat=True)
+                if claimable.filter(pk=pk).update(claimed_until=claimed_until)
+            ]
+        return self.model._default_manager.using(self.db).filter(pk__in=pks)
+
+
+class Reminder(models.Model):
+    """A mail to the participants of an event, sent some time before it starts"""
+
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name="reminders")
+    offset = models.DurationField(_("Time before the start"))
+    template_type = models.CharField(_("Mail template type"), max_length=255)
+    due_at = models.DateTimeField(_("Due at"))
+    sent_at = models.DateTimeField(_("Sent at"), null=True, blank=True)
+    claimed_until = models.DateTimeField(null=True, editable=False)
+
+    objects = ReminderQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.template_type} {self.event}"
+
+    class Meta:
+        indexes = [models.Index(fields=["due_at", "sent_at"])]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["event", "offset", "template_type"], name="unique_reminder"
+            )
+        ]
+        verbose_name = _("Reminder")
+        verbose_name_plural = _("Reminders")
+
+
+# compiled mail templates by (template id, language, field, hash of source)
+compiled_templates = {}
+
+
+def compile_template(template: str, key: tuple = None) -> Template:
+    """compile a template str, cached if a key is given
+
+    the hash of the source is part of the cache key, so changed templates are
+    never served from the cache, even if the cache was not invalidated"""
+    if key is None:
+        return Template(template)
+
+    key += (hashlib.sha1(template.encode()).hexdigest(),)
+    try:
+        return compiled_templates[key]
+    except KeyError:
+        compiled = compiled_templates[key] = Template(template)
+        return compiled
+
+
+def forget_compiled_templates(template_id: int):
+    """invalidate the cached compiled templates of a MailTemplate"""
+    for key in list(compiled_templates):
+        if key[0] == template_id:
+            compiled_templates.pop(key, None)
+
+
+def render_template(template: str, context: dict, key: tuple = None) -> str:
+    """helper to render a template str with context
+
+    key: cache key of the compiled template, see compile_template"""
     if template is None:
         return ""
-    return Template(template).render(Context(context))
+    return compile_template(template, key).render(Context(context))
 
 
 class MailTemplate(models.Model):
@@ -213,6 +578,22 @@ class MailTemplate(models.Model):
     def __str__(self) -> str:
         return self.get_type_display()
 
+    def clean(self):
+        """report syntax errors of the templates in all languages when saving"""
+        errors = {}
+        for field in self._meta.concrete_fields:
+            if not field.name.startswith(("subject_template", "body_template")):
+                continue
+            value = getattr(self, field.attname)
+            if not value:
+                continue
+            try:
+                Template(value)
+            except TemplateSyntaxError as e:
+                errors[field.name] = ValidationError(str(e))
+        if errors:
+            raise ValidationError(errors)
+
     def render(
         self, context: dict, to_email: str, connection=None
     ) -> mail.EmailMessage:
@@ -229,8 +610,13 @@ class MailTemplate(models.Model):
         try:
             # render templates using timezone
             with timezone.override(tzname):
-                subject = render_template(self.subject_template, context)
-                body = render_template(self.body_template, context)
+                language = translation.get_language()
+                subject = render_template(
+                    self.subject_template, context, (self.pk, language, "subject")
+                )
+                body = render_template(
+                    self.body_template, context, (self.pk, language, "body")
+                )
             return mail.EmailMessage(
                 subject=subject,
                 body=body,
@@ -247,11 +633,11 @@ class MailTemplate(models.Model):
         cls, type: str, context: dict, to_email: str, connection=None,
     ) -> mail.EmailMessage:
         """get template and render to email"""
-        templates = cls.objects.filter(type=type)
-        if not templates:
+        template = mail_templates.get(type)
+        if template is None:
             return None
 
-        return templates[0].render(
+        return template.render(
             context=context, to_email=to_email, connection=connection
         )
 
@@ -259,3 +645,136 @@ class MailTemplate(models.Model):
         ordering = ("type",)
         verbose_name = _("MailTemplate")
         verbose_name_plural = _("MailTemplates")
+
+
+class MailTemplateRegistry:
+    """In-process registry of the mail templates by type
+
+    All templates are loaded with one query, including the texts of all
+    languages. Workers notice changes by comparing their version with the
+    version in the shared cache, which is replaced when a template is saved."""
+
+    version_key = "arrange_videochat:mail_templates:version"
+
+    def __init__(self):
+        self.templates = None
+        self.version = None
+
+    def current_version(self) -> str:
+        cache = get_cache()
+        version = cache.get(self.version_key)
+        if version is None:
+            cache.add(self.version_key, uuid.uuid4().hex, None)
+            version = cache.get(self.version_key)
+        return version
+
+    def load(self):
+        """load all templates, the first template of each type is used"""
+        version = self.current_version()
+        templates = {}
+        for template in MailTemplate.objects.order_by("type", "pk"):
+            templates.setdefault(template.type, template)
+        self.templates, self.version = templates, version
+
+    def get(self, type: str) -> MailTemplate:
+        """get the template of the type or None"""
+        if self.templates is None or self.version != self.current_version():
+            self.load()
+        return self.templates.get(type)
+
+    def invalidate(self):
+        """make all workers reload the templates"""
+        get_cache().set(self.version_key, uuid.uuid4().hex, None)
+        self.templates = None
+
+
+mail_templates = MailTemplateRegistry()
+
+
+class OutgoingMailQuerySet(models.QuerySet):
+    def due(self):
+        """pending mails whose next attempt is due"""
+        return self.filter(
+            status=OutgoingMail.PENDING, next_attempt_at__lte=timezone.now()
+        )
+
+    def enqueue(self, messages) -> list:
+        """store email messages to be sent by the send_mail_queue command
+
+        call it in the transaction of the change the mails are about, so they
+        are queued if and only if the change is committed"""
+        return self.bulk_create(
+            [OutgoingMail.from_message(message) for message in messages if message]
+        )
+
+
+class OutgoingMail(models.Model):
+    """A mail waiting to be sent by the send_mail_queue command"""
+
+    PENDING = "pending"
+    SENT = "sent"
+    FAILED = "failed"
+
+    to = models.TextField(_("To"), help_text=_("Comma separated addresses"))
+    from_email = models.CharField(_("From"), max_length=254)
+    subject = models.TextField(_("Subject"))
+    body = models.TextField(_("Body"))
+    attachment = models.BinaryField(_("Attachment"), null=True, blank=True)
+    attachment_filename = models.CharField(max_length=255, blank=True)
+    attachment_mimetype = models.CharField(max_length=255, blank=True)
+
+    status = models.CharField(
+        _("Status"),
+        max_length=10,
+        choices=((PENDING, _("Pending")), (SENT, _("Sent")), (FAILED, _("Failed"))),
+        default=PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(_("Attempts"), default=0)
+    next_attempt_at = models.DateTimeField(_("Next attempt"), default=timezone.now)
+    last_error = models.TextField(_("Last error"), blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(_("Sent at"), null=True, blank=True)
+
+    objects = OutgoingMailQuerySet.as_manager()
+
+    @classmethod
+    def from_message(cls, message: mail.EmailMessage) -> "OutgoingMail":
+        """an unsaved queue entry of an email message with at most one attachment"""
+        outgoing = cls(
+            to=",".join(message.to),
+            from_email=message.from_email,
+            subject=message.subject,
+            body=message.body,
+        )
+        if message.attachments:
+            filename, content, mimetype = message.attachments[0]
+            if isinstance(content, str):
+                content = content.encode()
+            outgoing.attachment = content
+            outgoing.attachment_filename = filename
+            outgoing.attachment_mimetype = mimetype
+        return outgoing
+
+    def to_message(self, connection=None) -> mail.EmailMessage:
+        message = mail.EmailMessage(
+            subject=self.subject,
+            body=self.body,
+            from_email=self.from_email,
+            to=self.to.split(","),
+            connection=connection,
+        )
+        if self.attachment is not None:
+            message.attach(
+                filename=self.attachment_filename,
+                content=bytes(self.attachment),
+                mimetype=self.attachment_mimetype,
+            )
+        return message
+
+    def __str__(self):
+        return f"{self.to}: {self.subject}"
+
+    class Meta:
+        indexes = [models.Index(fields=["status", "next_attempt_at"])]
+        verbose_name = _("Outgoing mail")
+        verbose_name_plural = _("Outgoing mails")
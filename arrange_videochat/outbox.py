@@ -0,0 +1,100 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.core import mail
+from django.utils import timezone
+
+from .models import OutgoingMail
+
+logger = logging.getLogger(__name__)
+
+
+def max_attempts() -> int:
+    """attempts after which a mail is given up, configurable by
+    settings.ARRANGE_VIDEOCHAT_MAIL_MAX_ATTEMPTS"""
+    return getattr(settings, "ARRANGE_VIDEOCHAT_MAIL_MAX_ATTEMPTS", 6)
+
+
+def retry_delay(attempts: int) -> datetime.timedelta:
+    """exponential backoff after the given number of attempts, starting at
+    settings.ARRANGE_VIDEOCHAT_MAIL_RETRY_DELAY seconds"""
+    base = getattr(settings, "ARRANGE_VIDEOCHAT_MAIL_RETRY_DELAY", 60)
+    return datetime.timedelta(seconds=base * 2 ** (attempts - 1))
+
+
+def claim(outgoing: OutgoingMail) -> bool:
+    """count an attempt of a mail and push its next attempt back, so it is
+    retried if this worker dies. False if another worker claimed it first."""
+    attempts = outgoing.attempts + 1
+    next_attempt_at = timezone.now() + retry_delay(attempts)
+    claimed = OutgoingMail.objects.filter(
+        pk=outgoing.pk, status=OutgoingMail.PENDING, attempts=outgoing.attempts
+    ).update(attempts=attempts, next_attempt_at=next_attempt_at)
+    outgoing.attempts, outgoing.next_attempt_at = attempts, next_attempt_at
+    return bool(claimed)
+
+
+def mark_sent(outgoing: OutgoingMail):
+    outgoing.status = OutgoingMail.SENT
+    outgoing.sent_at = timezone.now()
+    outgoing.last_error = ""
+    outgoing.save(update_fields=["status", "sent_at", "last_error"])
+
+
+def mark_failed(outgoing: OutgoingMail, error):
+    """keep the mail for a retry at its next attempt or give up on it"""
+    logger.warning("Could not send mail %s to %s: %s", outgoing.pk, outgoing.to, error)
+    outgoing.last_error = str(error) or error.__class__.__name__
+    if outgoing.attempts >= max_attempts():
+        outgoing.status = OutgoingMail.FAILED
+    outgoing.save(update_fields=["status", "last_error"])
+
+
+def send_queued_mails(batch_size: int = 100, connection=None) -> tuple:
+    """send the due mails in batches, each over one connection
+
+    Stops when no mails are due or the mail server can not be reached.
+    Returns the number of sent mails and of failed attempts."""
+    connection = connection or mail.get_connection()
+    sent = failed = 0
+    while True:
+        batch = list(
+            OutgoingMail.objects.due().order_by("next_attempt_at")[:batch_size]
+        )
+        if not batch:
+            break
+        batch = [outgoing for outgoing in batch if claim(outgoing)]
+        if not batch:
+            # taken by another worker in the meantime
+            continue
+
+        try:
+            connection.open()
+        except Exception as e:  # pylint: disable=broad-except
+            # the server is down, the batch is retried after its backoff
+            for outgoing in batch:
+                mark_failed(outgoing, e)
+            failed += len(batch)
+            break
+
+        try:
+            for outgoing in batch:
+                try:
+                    accepted = connection.send_messages(
+                        [outgoing.to_message(connection)]
+                    )
+                except Exception as e:  # pylint: disable=broad-except
+                    accepted, error = 0, e
+                else:
+                    error = "Not accepted by the mail backend"
+
+                if accepted:
+                    mark_sent(outgoing)
+                    sent += 1
+                else:
+                    mark_failed(outgoing, error)
+                    failed += 1
+        finally:
+            connection.close()
+    return sent, failed
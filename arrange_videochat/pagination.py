@@ -0,0 +1,54 @@
+import base64
+import datetime
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+def position(event) -> (datetime.datetime, int):
+    """(start, id) of an event or of a dict of its values()"""
+    if isinstance(event, dict):
+        return event["start"], event["id"]
+    return event.start, event.pk
+
+
+def encode_cursor(event) -> str:
+    """encode the position of the event in the (start, id) ordering"""
+    start, pk = position(event)
+    return base64.urlsafe_b64encode(f"{start.isoformat()}|{pk}".encode()).decode()
+
+
+def decode_cursor(cursor: str) -> (datetime.datetime, int):
+    """decode a cursor created by encode_cursor, raises ValueError if invalid"""
+    position = base64.urlsafe_b64decode(cursor.encode()).decode()
+    start, pk = position.split("|")
+    start = parse_datetime(start)
+    if start is None:
+        raise ValueError(f"Invalid cursor {cursor!r}")
+    return start, int(pk)
+
+
+def after(queryset, start: datetime.datetime, pk: int):
+    """filter the events that follow (start, pk) in the (start, id) ordering
+
+    written as a range on start, so the index on start is used"""
+    return queryset.filter(Q(start__gte=start) & (Q(start__gt=start) | Q(pk__gt=pk)))
+
+
+def keyset_page(queryset, cursor: str, page_size: int):
+    """get the page of events (instances or values() with start and id)
+    following the cursor
+
+    Seeks on (start, id) instead of using an offset, so deep pages cost the
+    same as the first one. Returns the list of events and the cursor of the
+    next page, which is None on the last page."""
+    queryset = queryset.order_by("start", "pk")
+    if cursor:
+        queryset = after(queryset, *decode_cursor(cursor))
+
+    # one more row than the page tells whether another page follows
+    rows = list(queryset[: page_size + 1])
+    events = rows[:page_size]
+    if len(rows) <= page_size:
+        return events, None
+    return events, encode_cursor(events[-1])
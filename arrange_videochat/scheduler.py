@@ -0,0 +1,81 @@
+import heapq
+import datetime
+import time
+import logging
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from .models import Reminder
+from .cache import event_list_version
+from .dispatch import dispatch_reminders
+
+logger = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Sends the reminders to the participants of events when they are due
+
+    Keeps a heap of the due times of the reminders and sleeps until the next
+    one. New, changed and deleted events are noticed by polling the version of
+    the event list in the shared cache every poll_interval seconds, and by
+    reloading the heap every resync_interval seconds in any case."""
+
+    def __init__(
+        self, workers: int = 1, poll_interval: int = 5, resync_interval: int = 300
+    ):
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.resync_interval = resync_interval
+        self.heap = []
+        self.version = None
+        self.synced_at = None
+
+    def sync(self, now):
+        """load the due times of the reminders due before the next sync"""
+        self.version = event_list_version()
+        self.synced_at = now
+        until = now + datetime.timedelta(seconds=self.resync_interval)
+        self.heap = list(
+            Reminder.objects.filter(due_at__lte=until, sent_at__isnull=True)
+            .order_by()
+            .values_list("due_at", "pk")
+        )
+        heapq.heapify(self.heap)
+
+    def needs_sync(self, now) -> bool:
+        return (
+            self.synced_at is None
+            or (now - self.synced_at).total_seconds() >= self.resync_interval
+            or self.version != event_list_version()
+        )
+
+    def send_due(self, now) -> int:
+        """send the reminders that are due, returns the number of sent ones"""
+        while self.heap and self.heap[0][0] <= now:
+            heapq.heappop(self.heap)
+        sent, failed = dispatch_reminders(
+            Reminder.objects.due().claim().select_related("event__host"), self.workers
+        )
+        if sent or failed:
+            logger.info("Sent %d reminders, %d failed", sent, failed)
+        return sent
+
+    def tick(self, now=None) -> float:
+        """do the due work, returns the seconds until the next tick"""
+        now = now or timezone.now()
+        close_old_connections()
+        if self.needs_sync(now):
+            self.sync(now)
+        if self.heap and self.heap[0][0] <= now:
+            self.send_due(now)
+
+        until_sync = self.resync_interval - (now - self.synced_at).total_seconds()
+        wait = min(self.poll_interval, until_sync)
+        if self.heap:
+            wait = min(wait, (self.heap[0][0] - now).total_seconds())
+        return max(wait, 0)
+
+    def run(self):
+        while True:
+            time.sleep(self.tick())
@@ -0,0 +1,80 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import (
+    Event,
+    Participation,
+    MailTemplate,
+    forget_compiled_templates,
+    mail_templates,
+)
+from .cache import invalidate_event_list
+
+
+def change_seats_taken(event_ids, delta: int):
+    """add delta to the seat counter of the given events"""
+    events = Event.objects.filter(pk__in=event_ids)
+    if delta < 0:
+        events = events.filter(seats_taken__gte=-delta)
+    events.update(seats_taken=F("seats_taken") + delta, updated_at=timezone.now())
+
+
+@receiver(post_save, sender=Participation)
+def participation_saved(sender, instance, created, raw=False, **kwargs):
+    """count participations that were not created by
+    Participation.objects.reserve(), e.g. in the admin"""
+    if created and not raw and not getattr(instance, "seat_reserved", False):
+        change_seats_taken([instance.event_id], 1)
+
+
+@receiver(post_delete, sender=Participation)
+def participation_deleted(sender, instance, **kwargs):
+    """free the seat when leaving or when the user is deleted"""
+    change_seats_taken([instance.event_id], -1)
+
+
+@receiver(m2m_changed, sender=Event.participants.through)
+def participants_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """keep the seat counter up to date with event.participants.add() etc.,
+    these bypass the signals of Participation"""
+    if action == "pre_clear" and reverse:
+        # remember the events of the user, they are unknown after clearing
+        instance.cleared_event_ids = list(instance.events.values_list("pk", flat=True))
+    elif action == "post_add":
+        if reverse:
+            change_seats_taken(pk_set, 1)
+        else:
+            change_seats_taken([instance.pk], len(pk_set))
+    elif action in ("post_remove", "post_clear"):
+        if not reverse:
+            event_ids = [instance.pk]
+        elif action == "post_remove":
+            event_ids = pk_set
+        else:
+            event_ids = instance.cleared_event_ids
+        with transaction.atomic():
+            Event.objects.filter(pk__in=event_ids).repair_seats_taken()
+
+
+@receiver(post_save, sender=Event)
+@receiver(post_delete, sender=Event)
+@receiver(post_save, sender=Participation)
+@receiver(post_delete, sender=Participation)
+@receiver(m2m_changed, sender=Event.participants.through)
+def event_list_changed(sender, **kwargs):
+    """invalidate the cached event list once the change is committed, otherwise
+    other workers could cache the old list again under the new version"""
+    transaction.on_commit(invalidate_event_list)
+
+
+@receiver(post_save, sender=MailTemplate)
+@receiver(post_delete, sender=MailTemplate)
+def mail_template_changed(sender, instance, **kwargs):
+    """drop the compiled versions of the changed template and reload the
+    templates in all workers once the change is committed, otherwise they
+    could reload the old templates under the new version"""
+    forget_compiled_templates(instance.pk)
+    transaction.on_commit(mail_templates.invalidate)
@@ -0,0 +1,58 @@
+from unittest import mock
+
+from django import test
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from arrange_videochat.cache import get_cache
+from arrange_videochat.models import mail_templates
+from arrange_videochat.users import user_ids
+
+
+class TestCase(test.TestCase):
+    """TestCase that runs the transaction.on_commit() callbacks of the tested
+    code when it would commit: when its outermost atomic block is left without
+    an error, or right away outside of atomic blocks
+
+    Django's TestCase wraps every test in a transaction that is rolled back, so
+    the callbacks would never run. Each test also starts with empty caches."""
+
+    def _pre_setup(self):
+        super()._pre_setup()
+        get_cache().clear()
+        # templates loaded by an earlier test were rolled back
+        mail_templates.invalidate()
+        user_ids.clear()
+        self.addCleanup(user_ids.clear)
+
+        connection = connections[DEFAULT_DB_ALIAS]
+        # the atomic blocks of the test case itself
+        depth = len(connection.savepoint_ids)
+        # callbacks queued before the test, e.g. in setUpTestData, never run
+        queued = len(connection.run_on_commit)
+
+        def commit():
+            if len(connection.savepoint_ids) != depth:
+                return
+            while len(connection.run_on_commit) > queued:
+                _, callback = connection.run_on_commit.pop(queued)
+                callback()
+
+        on_commit = connection.on_commit
+
+        def on_commit_and_run(func):
+            on_commit(func)
+            commit()
+
+        atomic_exit = transaction.Atomic.__exit__
+
+        def atomic_exit_and_run(atomic, exc_type, exc_value, traceback):
+            atomic_exit(atomic, exc_type, exc_value, traceback)
+            if exc_type is None and atomic.using in (None, DEFAULT_DB_ALIAS):
+                commit()
+
+        for patcher in (
+            mock.patch.object(connection, "on_commit", on_commit_and_run),
+            mock.patch.object(transaction.Atomic, "__exit__", atomic_exit_and_run),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
@@ -1,13 +1,25 @@
 import datetime
+import smtplib
+import threading
+import socketserver
 import pytz
+from io import StringIO
+from unittest import mock
 
-from django.test import TestCase
+from django.test import override_settings
 from django.core import mail
-from django.core.management import call_command
+from django.core.management import call_command, CommandError
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
-from arrange_videochat.models import Event, MailTemplate
+from arrange_videochat.tests import TestCase
+from arrange_videochat.models import (
+    Event,
+    MailTemplate,
+    OutgoingMail,
+    Participation,
+    Reminder,
+)
 
 User = get_user_model()
 
@@ -50,6 +62,136 @@ class CheckSeminarsTestCase(TestCase):
         self.assertEqual(len(mail.outbox), 2)
 
 
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """a local SMTP server that only counts connections and messages"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.connections = 0
+        self.messages = 0
+        self.lock = threading.Lock()
+
+    def __enter__(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown()
+        self.server_close()
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        with self.server.lock:
+            self.server.connections += 1
+        self.reply("220 sink")
+        for line in self.rfile:
+            command = line.decode().strip().upper()
+            if command.startswith("EHLO"):
+                self.reply("250 sink")
+            elif command == "DATA":
+                self.reply("354 go ahead")
+                for data in self.rfile:
+                    if data == b".\r\n":
+                        break
+                with self.server.lock:
+                    self.server.messages += 1
+                self.reply("250 queued")
+            elif command == "QUIT":
+                self.reply("221 bye")
+                break
+            else:
+                self.reply("250 ok")
+
+
+class CronWorkersTestCase(TestCase):
+    def setUp(self):
+        self.host = User.objects.create(
+            email="host@example.com", username="host@example.com"
+        )
+        for i in range(6):
+            event = Event.objects.create(
+                host=self.host, start=timezone.now() + datetime.timedelta(minutes=30)
+            )
+            email = f"test{i}@example.com"
+            event.participants.add(User.objects.create(email=email, username=email))
+        MailTemplate(type="join", subject_template="test", body_template="test").save()
+
+    def test_workers(self):
+        out = StringIO()
+        call_command("cron", workers=3, stdout=out)
+        self.assertIn("Sent 6 reminders, 0 failed", out.getvalue())
+        self.assertEqual(len(mail.outbox), 12)
+        self.assertFalse(Event.objects.filter(mails_sent=False).exists())
+
+    def test_claimed_events_are_skipped(self):
+        # another host is sending the reminders
+        Reminder.objects.due().claim()
+        call_command("cron", workers=2, stdout=StringIO())
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_smtp_connections_are_reused(self):
+        with SMTPSink() as sink, override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.smtp.EmailBackend",
+            EMAIL_HOST="127.0.0.1",
+            EMAIL_PORT=sink.server_address[1],
+        ):
+            call_command("cron", workers=2, stdout=StringIO())
+
+        self.assertEqual(sink.messages, 12)
+        self.assertLessEqual(sink.connections, 2)
+        self.assertFalse(Event.objects.filter(mails_sent=False).exists())
+
+    def test_failed_event_is_isolated(self):
+        failing = Event.objects.first()
+        failing_email = failing.participants.get().email
+        send_messages = mail.get_connection().__class__.send_messages
+
+        def fail_for_one_event(connection, messages):
+            if messages[0].to[0] == failing_email:
+                raise smtplib.SMTPServerDisconnected("gone")
+            return send_messages(connection, messages)
+
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            fail_for_one_event,
+        ):
+            out = StringIO()
+            call_command("cron", workers=2, stdout=out)
+
+        self.assertIn("Sent 5 reminders, 1 failed", out.getvalue())
+        self.assertEqual(len(mail.outbox), 10)
+        # the failed event is retried by the next run
+        self.assertEqual(list(Event.objects.filter(mails_sent=False)), [failing])
+        self.assertEqual(len(Reminder.objects.due().claim()), 1)
+
+    def test_failed_rendering_is_isolated(self):
+        failing = Event.objects.first()
+        participant_mails = Event.participant_mails
+
+        def fail_for_one_event(event, *args, **kwargs):
+            if event.pk == failing.pk:
+                raise ValueError("broken template")
+            return participant_mails(event, *args, **kwargs)
+
+        with mock.patch.object(
+            Event, "participant_mails", fail_for_one_event
+        ), self.assertLogs("arrange_videochat.dispatch", "ERROR"):
+            out = StringIO()
+            call_command("cron", workers=2, stdout=out)
+
+        self.assertIn("Sent 5 reminders, 1 failed", out.getvalue())
+        self.assertEqual(len(mail.outbox), 10)
+        self.assertEqual(list(Event.objects.filter(mails_sent=False)), [failing])
+        self.assertEqual(len(Reminder.objects.due().claim()), 1)
+
+
 class CheckSeminarsDeletedTestCase(TestCase):
     def setUp(self):
         self.host = User(email="host@example.com", username="host@example.com")
@@ -74,3 +216,198 @@ class CheckSeminarsDeletedTestCase(TestCase):
         self.assertEqual(Event.objects.all().count(), 1)
         call_command("cron")
         self.assertEqual(Event.objects.all().count(), 1)
+
+    def test_delete_in_batches(self):
+        current = Event.objects.create(host=self.host, start=timezone.now())
+        current.participants.add(self.host)
+        for day in range(1, 6):
+            event = Event.objects.create(
+                host=self.host,
+                start=timezone.now() - datetime.timedelta(days=day, hours=1),
+            )
+            event.participants.add(self.host)
+
+        out = StringIO()
+        call_command("cron", batch_size=2, stdout=out)
+        self.assertIn("Deleted 5 events and 10 related rows", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertEqual(list(Event.objects.all()), [current])
+        self.assertEqual(Participation.objects.get().event, current)
+
+
+class DeleteOrphanedUsersTestCase(TestCase):
+    def setUp(self):
+        self.past = timezone.now() - datetime.timedelta(days=2)
+        self.host = self.user("host@example.com")
+        self.participant = self.user("participant@example.com")
+        event = Event.objects.create(host=self.host, start=timezone.now())
+        event.participants.add(self.participant)
+
+        # kept
+        self.user("staff@example.com", is_staff=True)
+        self.user("admin@example.com", is_superuser=True)
+        self.user("login@example.com", last_login=self.past)
+        self.user("new@example.com", date_joined=timezone.now())
+        # deleted
+        self.user("orphan1@example.com")
+        self.user("orphan2@example.com")
+        old_host = self.user("old@example.com")
+        Event.objects.create(host=old_host, start=self.past)
+
+    def user(self, email, **kwargs):
+        kwargs.setdefault("date_joined", self.past)
+        return User.objects.create(username=email, email=email, **kwargs)
+
+    def test_delete(self):
+        out = StringIO()
+        call_command("cron", batch_size=1, stdout=out)
+        self.assertIn("Deleted 3 orphaned users", out.getvalue())
+        self.assertIn("users/s", out.getvalue())
+        self.assertEqual(
+            sorted(User.objects.values_list("username", flat=True)),
+            [
+                "admin@example.com",
+                "host@example.com",
+                "login@example.com",
+                "new@example.com",
+                "participant@example.com",
+                "staff@example.com",
+            ],
+        )
+
+    def test_dry_run(self):
+        out = StringIO()
+        call_command("cron", users_dry_run=True, stdout=out)
+        self.assertIn("Would delete 3 orphaned users", out.getvalue())
+        self.assertEqual(User.objects.count(), 9)
+
+
+class RepairSeatsTestCase(TestCase):
+    def test_repair(self):
+        host = User.objects.create(
+            email="host@example.com", username="host@example.com"
+        )
+        event = Event.objects.create(
+            host=host, start=datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC)
+        )
+        event.participants.add(host)
+        Event.objects.update(seats_taken=0)
+
+        out = StringIO()
+        call_command("repair_seats", stdout=out)
+        self.assertIn("Repaired seat counters of 1 events", out.getvalue())
+        self.assertEqual(Event.objects.get().seats_taken, 1)
+
+
+class SeedEventsTestCase(TestCase):
+    def test_seed(self):
+        out = StringIO()
+        call_command("seed_events", events=3, participants=4, starts_in=30, stdout=out)
+        self.assertIn("Created 3 events with 4 participants each", out.getvalue())
+
+        events = Event.objects.all()
+        self.assertEqual(len(events), 3)
+        self.assertEqual(Participation.objects.count(), 12)
+        self.assertEqual(User.objects.count(), 15)
+        for event in events:
+            self.assertTrue(event.is_full)
+            self.assertEqual(event.participants.count(), 4)
+        # the reminders one hour before the start are due
+        self.assertEqual(Reminder.objects.due().count(), 3)
+
+        # again with new users
+        call_command("seed_events", events=1, participants=0, stdout=out)
+        self.assertEqual(Event.objects.count(), 4)
+
+    @override_settings(
+        ARRANGE_VIDEOCHAT_REMINDERS=[
+            (datetime.timedelta(days=1), "join"),
+            (datetime.timedelta(hours=1), "join"),
+        ]
+    )
+    def test_reminders_already_due(self):
+        call_command("seed_events", events=3, starts_in=30, stdout=StringIO())
+        # like Event.schedule_reminders() only the last due reminder
+        self.assertEqual(Reminder.objects.count(), 3)
+        self.assertEqual(
+            set(Reminder.objects.values_list("offset", flat=True)),
+            {datetime.timedelta(hours=1)},
+        )
+
+    def test_too_many_participants(self):
+        with self.assertRaises(CommandError):
+            call_command("seed_events", participants=Event.max_participants)
+
+
+class SendMailQueueTestCase(TestCase):
+    def setUp(self):
+        message = mail.EmailMessage(
+            "subject", "body", "from@example.com", ["to@example.com"]
+        )
+        message.attach("event.ical", b"BEGIN:VCALENDAR", "text/calendar")
+        OutgoingMail.objects.enqueue([message])
+
+    def send_mail_queue(self):
+        out = StringIO()
+        call_command("send_mail_queue", stdout=out)
+        return out.getvalue()
+
+    def test_send(self):
+        self.assertIn("Sent 1 mails, 0 failed", self.send_mail_queue())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ["to@example.com"])
+        self.assertEqual(mail.outbox[0].body, "body")
+        self.assertEqual(
+            mail.outbox[0].attachments,
+            [("event.ical", "BEGIN:VCALENDAR", "text/calendar")],
+        )
+
+        outgoing = OutgoingMail.objects.get()
+        self.assertEqual(outgoing.status, OutgoingMail.SENT)
+        self.assertIsNotNone(outgoing.sent_at)
+
+        # sent mails are not sent again
+        self.assertIn("Sent 0 mails", self.send_mail_queue())
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_retry_with_backoff(self):
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            side_effect=smtplib.SMTPServerDisconnected("gone"),
+        ):
+            self.assertIn("Sent 0 mails, 1 failed", self.send_mail_queue())
+
+        outgoing = OutgoingMail.objects.get()
+        self.assertEqual(outgoing.status, OutgoingMail.PENDING)
+        self.assertEqual(outgoing.attempts, 1)
+        self.assertEqual(outgoing.last_error, "gone")
+        self.assertGreater(outgoing.next_attempt_at, timezone.now())
+
+        # not retried before the backoff is over
+        self.send_mail_queue()
+        self.assertEqual(len(mail.outbox), 0)
+
+        OutgoingMail.objects.update(next_attempt_at=timezone.now())
+        self.send_mail_queue()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(OutgoingMail.objects.get().status, OutgoingMail.SENT)
+
+    def test_server_down(self):
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.open",
+            side_effect=ConnectionRefusedError(),
+        ):
+            self.assertIn("Sent 0 mails, 1 failed", self.send_mail_queue())
+        self.assertEqual(OutgoingMail.objects.get().attempts, 1)
+
+    def test_give_up(self):
+        OutgoingMail.objects.update(attempts=5)
+        with mock.patch(
+            "django.core.mail.backends.locmem.EmailBackend.send_messages",
+            return_value=0,
+        ):
+            self.send_mail_queue()
+
+        outgoing = OutgoingMail.objects.get()
+        self.assertEqual(outgoing.status, OutgoingMail.FAILED)
+        self.assertEqual(outgoing.attempts, 6)
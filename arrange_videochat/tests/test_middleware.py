@@ -0,0 +1,75 @@
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+
+from arrange_videochat.tests import TestCase
+from arrange_videochat.cache import get_cache
+from arrange_videochat.middleware import InstrumentationMiddleware
+from arrange_videochat.models import Event
+
+INSTRUMENTED = {
+    "MIDDLEWARE": settings.MIDDLEWARE
+    + ["arrange_videochat.middleware.InstrumentationMiddleware"],
+    "ARRANGE_VIDEOCHAT_INSTRUMENTATION": True,
+}
+
+
+class InstrumentationMiddlewareTestCase(TestCase):
+    url = reverse("arrange_videochat:list")
+
+    def setUp(self):
+        # render the list instead of serving it from the cache
+        get_cache().clear()
+
+    def timings(self, response) -> dict:
+        return {
+            metric.split(";")[0]: metric
+            for metric in response["Server-Timing"].split(", ")
+        }
+
+    @override_settings(ARRANGE_VIDEOCHAT_INSTRUMENTATION=False)
+    def test_disabled(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            InstrumentationMiddleware(lambda request: HttpResponse())
+        response = self.client.get(self.url)
+        self.assertNotIn("Server-Timing", response)
+
+    @override_settings(**INSTRUMENTED)
+    def test_server_timing(self):
+        response = self.client.get(self.url)
+        timings = self.timings(response)
+        self.assertEqual(set(timings), {"db", "template", "mail", "total"})
+        # the start of the first event for the etag, then the page
+        self.assertIn('desc="2 queries"', timings["db"])
+        self.assertNotEqual(timings["template"], "template;dur=0.0")
+
+    @override_settings(**INSTRUMENTED)
+    def test_mail(self):
+        def send(request):
+            mail.send_mail("test", "test", None, ["max@example.com"])
+            return HttpResponse()
+
+        middleware = InstrumentationMiddleware(send)
+        response = middleware(RequestFactory().get("/"))
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("mail;dur=", response["Server-Timing"])
+
+    @override_settings(**INSTRUMENTED)
+    def test_log(self):
+        with self.assertLogs("arrange_videochat.middleware", "INFO") as logs:
+            self.client.get(self.url)
+        self.assertEqual(len(logs.records), 1)
+        record = logs.records[0]
+        self.assertIn(f"path={self.url} status=200", record.getMessage())
+        self.assertEqual(record.request_timings["queries"], 2)
+
+    @override_settings(ARRANGE_VIDEOCHAT_SLOW_REQUEST=0, **INSTRUMENTED)
+    def test_slow_request(self):
+        with self.assertLogs("arrange_videochat.middleware", "WARNING") as logs:
+            self.client.get(self.url)
+        message = logs.records[0].getMessage()
+        self.assertIn("Slow request GET", message)
+        self.assertIn(Event._meta.db_table, message)
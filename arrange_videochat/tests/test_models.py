@@ -1,13 +1,30 @@
+import sys
+import time
 import datetime
+import threading
 import pytz
+from unittest import mock
 
-from django.test import TestCase
+from django.test import TransactionTestCase, override_settings
+from django.db import connection, transaction, OperationalError
 from django.contrib.auth import get_user_model
 from django.core import mail
-from django.utils import translation
+from django.utils import translation, timezone
 from django.urls import reverse
+from django.template import Template
+from django.core.exceptions import ValidationError
 
-from arrange_videochat.models import Event, MailTemplate
+from arrange_videochat.tests import TestCase
+from arrange_videochat.models import (
+    Event,
+    MailTemplate,
+    MailTemplateRegistry,
+    Participation,
+    Reminder,
+    mail_templates,
+)
+from arrange_videochat.cache import get_cache
+from arrange_videochat import ical
 
 User = get_user_model()
 
@@ -46,11 +63,44 @@ class EventTestCase(TestCase):
         )
 
     def test_ical(self):
+        self.event.created_at = datetime.datetime(2020, 4, 1, 12, 0, tzinfo=pytz.UTC)
         self.assertEqual(
             self.event.ical,
-            b"BEGIN:VCALENDAR\r\nBEGIN:VEVENT\r\nSUMMARY:Video Chat Event\r\nDTSTART;VALUE=DATE-TIME:20200501T200000Z\r\nEND:VEVENT\r\nEND:VCALENDAR\r\n",
+            (
+                "BEGIN:VCALENDAR\r\n"
+                "VERSION:2.0\r\n"
+                "PRODID:-//CoronaCircles//arrange_videochat//EN\r\n"
+                "CALSCALE:GREGORIAN\r\n"
+                "METHOD:PUBLISH\r\n"
+                "X-WR-TIMEZONE:UTC\r\n"
+                "BEGIN:VEVENT\r\n"
+                f"UID:{self.event.uuid}@testserver\r\n"
+                "DTSTAMP:20200401T120000Z\r\n"
+                "DTSTART:20200501T200000Z\r\n"
+                "DTEND:20200501T210000Z\r\n"
+                "SUMMARY:Video Chat\r\n"
+                f"URL:https://meet.allmende.io/{self.event.uuid}\r\n"
+                "END:VEVENT\r\n"
+                "END:VCALENDAR\r\n"
+            ).encode(),
         )
 
+    def test_ical_cache(self):
+        first = self.event.ical
+        self.assertIs(self.event.ical, first)
+
+        # a changed start is not served from the cache
+        self.event.start += datetime.timedelta(hours=1)
+        self.assertIn(b"DTSTART:20200501T210000Z", self.event.ical)
+
+    def test_ical_fold(self):
+        line = "SUMMARY:" + "ä" * 80
+        folded = ical.fold(line)
+        for part in folded.split("\r\n "):
+            self.assertLessEqual(len(part.encode()), 75)
+        self.assertEqual(folded.replace("\r\n ", ""), line)
+        self.assertEqual(ical.escape_text("a,b;c\nd"), "a\\,b\\;c\\nd")
+
     def test_mail_participants(self):
         event = Event(
             host=self.host,
@@ -75,6 +125,62 @@ class EventTestCase(TestCase):
         # mail is in right timezone (20:00 UTC is 22:00 CEST)
         self.assertEqual(mail.outbox[0].body, "1. Mai 2020 22:00")
 
+    def test_mail_participants_batched(self):
+        MailTemplate(
+            type="join",
+            subject_template_en="{{ event.start }}",
+            body_template_en="leave: {{ leave_url }}",
+        ).save()
+        participations = []
+        for i in range(3):
+            email = f"test{i}@example.com"
+            user = User.objects.create(email=email, username=email)
+            participations.append(
+                Participation.objects.create(event=self.event, user=user)
+            )
+        event = Event.objects.select_related("host").get(pk=self.event.pk)
+        mail_templates.get("join")
+
+        with mock.patch(
+            "arrange_videochat.models.Template", wraps=Template
+        ) as template, self.assertNumQueries(3):
+            # one query for the recipients, two to save the event
+            sent = event.mail_participants(connection=mail.get_connection())
+
+        # subject and body are rendered once for all recipients
+        self.assertLessEqual(template.call_count, 2)
+        self.assertEqual(sent, 4)
+        self.assertEqual(len(mail.outbox), 4)
+        bodies = {message.to[0]: message.body for message in mail.outbox}
+        for participation in participations:
+            self.assertEqual(
+                bodies[participation.user.email], f"leave: {participation.leave_url}"
+            )
+        self.assertEqual(bodies["host@example.com"], "leave: ")
+        self.assertEqual(
+            {message.subject for message in mail.outbox}, {mail.outbox[0].subject}
+        )
+        self.assertTrue(Event.objects.get(pk=event.pk).mails_sent)
+
+    def test_mail_participants_host_without_leave_url(self):
+        MailTemplate(
+            type="join",
+            subject_template_en="test",
+            body_template_en="{% if leave_url %}leave: {{ leave_url }}{% endif %}",
+        ).save()
+        user = User.objects.create(email="max@example.com", username="max@example.com")
+        participation = Participation.objects.create(event=self.event, user=user)
+        self.event.mail_participants()
+
+        bodies = {message.to[0]: message.body for message in mail.outbox}
+        self.assertEqual(bodies["max@example.com"], f"leave: {participation.leave_url}")
+        self.assertEqual(bodies["host@example.com"], "")
+
+    def test_mail_participants_without_template(self):
+        self.assertEqual(self.event.mail_participants(), 0)
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertTrue(self.event.mails_sent)
+
 
 class EventQuerySetTestCase(TestCase):
     def test_upcoming(self):
@@ -88,6 +194,243 @@ class EventQuerySetTestCase(TestCase):
         ).save()
         self.assertEqual(Event.objects.upcoming().count(), 1)
 
+    def test_with_availability(self):
+        host = User(email="host@example.com", username="host@example.com")
+        host.save()
+        event = Event(
+            host=host, start=datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC)
+        )
+        event.save()
+
+        annotated = Event.objects.with_availability().get()
+        self.assertEqual(annotated.participant_count, 1)
+        self.assertFalse(annotated.is_full)
+
+        # add 4 participants, 5 including host
+        for i in range(1, 5):
+            email = f"test{i}@example.com"
+            event.participants.add(User.objects.create(email=email, username=email))
+
+        annotated = Event.objects.with_availability().get()
+        with self.assertNumQueries(0):
+            self.assertEqual(annotated.participant_count, 5)
+            self.assertTrue(annotated.is_full)
+
+
+@override_settings(
+    ARRANGE_VIDEOCHAT_REMINDERS=[
+        (datetime.timedelta(hours=24), "join"),
+        (datetime.timedelta(hours=1), "join"),
+        (datetime.timedelta(minutes=5), "join"),
+    ]
+)
+class ReminderTestCase(TestCase):
+    def setUp(self):
+        self.host = User.objects.create(
+            email="host@example.com", username="host@example.com"
+        )
+
+    def create_event(self, start):
+        return Event.objects.create(host=self.host, start=timezone.now() + start)
+
+    def offsets(self, event):
+        return sorted(event.reminders.values_list("offset", flat=True))
+
+    def test_scheduled_on_create(self):
+        event = self.create_event(datetime.timedelta(days=2))
+        self.assertEqual(
+            self.offsets(event),
+            [
+                datetime.timedelta(minutes=5),
+                datetime.timedelta(hours=1),
+                datetime.timedelta(hours=24),
+            ],
+        )
+        for reminder in event.reminders.all():
+            self.assertEqual(reminder.due_at, event.start - reminder.offset)
+        self.assertFalse(Reminder.objects.due().exists())
+
+    def test_only_last_due_reminder(self):
+        # 24h and 1h are already due, only the later one is sent
+        event = self.create_event(datetime.timedelta(minutes=30))
+        self.assertEqual(
+            self.offsets(event),
+            [datetime.timedelta(minutes=5), datetime.timedelta(hours=1)],
+        )
+        self.assertEqual(
+            list(Reminder.objects.due().values_list("offset", flat=True)),
+            [datetime.timedelta(hours=1)],
+        )
+
+    def test_reschedule(self):
+        event = self.create_event(datetime.timedelta(minutes=30))
+        Reminder.objects.update(sent_at=timezone.now())
+
+        event.start += datetime.timedelta(days=2)
+        event.save()
+        # all reminders are in the future again
+        self.assertEqual(len(self.offsets(event)), 3)
+        self.assertFalse(event.reminders.filter(sent_at__isnull=False).exists())
+        for reminder in event.reminders.all():
+            self.assertEqual(reminder.due_at, event.start - reminder.offset)
+
+    def test_save_without_reschedule(self):
+        event = Event.objects.get(pk=self.create_event(datetime.timedelta(days=2)).pk)
+        # one update and the refresh of the seat counter
+        with self.assertNumQueries(2):
+            event.save()
+
+    def test_claim(self):
+        self.create_event(datetime.timedelta(minutes=30))
+        reminder = Reminder.objects.due().get()
+        self.assertEqual(list(Reminder.objects.due().claim()), [reminder])
+        # claimed reminders are skipped by other workers
+        self.assertEqual(list(Reminder.objects.due().claim()), [])
+
+    def test_expired_lease(self):
+        self.create_event(datetime.timedelta(minutes=30))
+        Reminder.objects.due().claim(lease=-1)
+        self.assertEqual(len(Reminder.objects.due().claim()), 1)
+
+    def test_claim_skip_locked(self):
+        self.create_event(datetime.timedelta(minutes=30))
+        with mock.patch.object(
+            connection.features, "has_select_for_update_skip_locked", True
+        ):
+            self.assertEqual(len(Reminder.objects.due().claim()), 1)
+            self.assertEqual(len(Reminder.objects.due().claim()), 0)
+
+
+class ParticipationTestCase(TestCase):
+    def setUp(self):
+        self.host = User(email="host@example.com", username="host@example.com")
+        self.host.save()
+        self.event = Event(
+            host=self.host, start=datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC)
+        )
+        self.event.save()
+
+    def create_users(self, count):
+        users = []
+        for i in range(count):
+            email = f"test{i}@example.com"
+            users.append(User.objects.create(email=email, username=email))
+        return users
+
+    def test_reserve(self):
+        users = self.create_users(5)
+        for user in users[:4]:
+            self.assertIsNotNone(Participation.objects.reserve(self.event, user))
+
+        # event is full
+        self.assertIsNone(Participation.objects.reserve(self.event, users[4]))
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 4)
+        self.assertEqual(Participation.objects.count(), 4)
+
+    def test_reserve_twice(self):
+        user = self.create_users(1)[0]
+        first = Participation.objects.reserve(self.event, user)
+        second = Participation.objects.reserve(self.event, user)
+        self.assertEqual(first, second)
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 1)
+
+    def test_delete_frees_seat(self):
+        users = self.create_users(5)
+        participations = [
+            Participation.objects.reserve(self.event, user) for user in users[:4]
+        ]
+        participations[0].delete()
+        self.assertIsNotNone(Participation.objects.reserve(self.event, users[4]))
+        self.event.refresh_from_db()
+        self.assertEqual(self.event.seats_taken, 4)
+
+    def test_seats_taken_is_maintained(self):
+        users = self.create_users(3)
+        # created without reservation, e.g. in the admin
+        participation = Participation.objects.create(event=self.event, user=users[0])
+        self.event.participants.add(users[1])
+        users[2].events.add(self.event)
+        self.event.save()
+        self.assertEqual(self.event.seats_taken, 3)
+
+        participation.delete()
+        # deleting the user cascades to its participation
+        users[1].delete()
+        self.event.save()
+        self.assertEqual(self.event.seats_taken, 1)
+
+        users[2].events.clear()
+        self.event.save()
+        self.assertEqual(self.event.seats_taken, 0)
+
+    def test_save_does_not_overwrite_seats_taken(self):
+        stale = Event.objects.get(pk=self.event.pk)
+        Participation.objects.reserve(self.event, self.create_users(1)[0])
+        stale.language = "de"
+        stale.save()
+        self.assertEqual(Event.objects.get().seats_taken, 1)
+
+    def test_repair_seats_taken(self):
+        Participation.objects.reserve(self.event, self.create_users(1)[0])
+        Event.objects.update(seats_taken=3)
+        self.assertEqual(Event.objects.repair_seats_taken(), 1)
+        self.assertEqual(Event.objects.get().seats_taken, 1)
+        self.assertEqual(Event.objects.repair_seats_taken(), 0)
+
+
+class ParticipationConcurrencyTestCase(TransactionTestCase):
+    joiners = 40
+
+    def test_no_overbooking(self):
+        host = User.objects.create(
+            email="host@example.com", username="host@example.com"
+        )
+        event = Event.objects.create(
+            host=host, start=datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC)
+        )
+        users = [
+            User.objects.create(email=f"test{i}@example.com", username=f"test{i}")
+            for i in range(self.joiners)
+        ]
+        barrier = threading.Barrier(self.joiners)
+        errors = []
+
+        def join(user):
+            try:
+                barrier.wait()
+                for _ in range(1000):
+                    try:
+                        Participation.objects.reserve(event, user)
+                        break
+                    except OperationalError:
+                        # the shared-cache sqlite test database reports
+                        # conflicting writers instead of waiting for them
+                        time.sleep(0.001)
+                else:
+                    errors.append(f"{user} could not join")
+            except Exception as e:  # pylint: disable=broad-except
+                errors.append(e)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=join, args=(user,)) for user in users]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        self.assertEqual(errors, [])
+        event.refresh_from_db()
+        self.assertEqual(Participation.objects.filter(event=event).count(), 4)
+        self.assertEqual(event.seats_taken, 4)
+        sys.stderr.write(
+            f"\n{self.joiners} concurrent joins: {self.joiners / elapsed:.0f} joins/s\n"
+        )
+
 
 class MailTemplateTestCase(TestCase):
     def test_render(self):
@@ -132,3 +475,69 @@ class MailTemplateTestCase(TestCase):
         translation.activate("en")
         email = MailTemplate.get_mail("join_confirmation", {}, "max@example.com",)
         self.assertEqual(email.subject, "english")
+
+    def test_compiled_template_cache(self):
+        template = MailTemplate(
+            type="join_confirmation", subject_template="test", body_template="first"
+        )
+        template.save()
+
+        with mock.patch(
+            "arrange_videochat.models.Template", wraps=Template
+        ) as compile_mock:
+            template.render({}, "max@example.com")
+            template.render({}, "max@example.com")
+        # subject and body are compiled once
+        self.assertEqual(compile_mock.call_count, 2)
+
+        template.body_template = "second"
+        template.save()
+        self.assertEqual(template.render({}, "max@example.com").body, "second")
+
+    def test_syntax_error_on_save(self):
+        template = MailTemplate(
+            type="join_confirmation",
+            subject_template="test",
+            body_template="test",
+            body_template_de="{% if %}",
+        )
+        with self.assertRaises(ValidationError) as context:
+            template.full_clean()
+        self.assertIn("body_template_de", context.exception.message_dict)
+
+
+class MailTemplateRegistryTestCase(TestCase):
+    def setUp(self):
+        self.template = MailTemplate(
+            type="join", subject_template="test", body_template="first"
+        )
+        self.template.save()
+
+    def test_no_queries(self):
+        mail_templates.get("join")
+        with self.assertNumQueries(0):
+            self.assertEqual(mail_templates.get("join"), self.template)
+            self.assertIsNone(mail_templates.get("deleted"))
+
+    def test_reload_on_save(self):
+        mail_templates.get("join")
+        self.template.body_template = "second"
+        self.template.save()
+        self.assertEqual(mail_templates.get("join").body_template, "second")
+
+    def test_reload_after_commit(self):
+        mail_templates.get("join")
+        version = mail_templates.current_version()
+        with transaction.atomic():
+            self.template.body_template = "second"
+            self.template.save()
+            # other workers must not reload the old template under a new version
+            self.assertEqual(mail_templates.current_version(), version)
+        self.assertEqual(mail_templates.get("join").body_template, "second")
+
+    def test_reload_on_change_in_other_worker(self):
+        mail_templates.get("join")
+        # another worker saved a template and replaced the version
+        MailTemplate.objects.update(body_template="second")
+        get_cache().set(MailTemplateRegistry.version_key, "other")
+        self.assertEqual(mail_templates.get("join").body_template, "second")
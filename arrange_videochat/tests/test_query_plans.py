@@ -0,0 +1,79 @@
+import re
+import datetime
+import unittest
+import pytz
+
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from arrange_videochat.tests import TestCase
+from arrange_videochat.models import Event, Participation, Reminder
+from arrange_videochat.pagination import after
+
+User = get_user_model()
+
+# a plan line like "SCAN arrange_videochat_event" (or "SCAN TABLE ..." in older
+# SQLite versions) without "USING INDEX" is a sequential scan of the table
+SEQUENTIAL_SCAN = re.compile(r"\bSCAN (TABLE )?\w+$")
+
+
+def sequential_scans(plan: str) -> list:
+    """lines of an sqlite query plan that scan a whole table"""
+    return [line for line in plan.splitlines() if SEQUENTIAL_SCAN.search(line.strip())]
+
+
+@unittest.skipUnless(connection.vendor == "sqlite", "query plans are sqlite specific")
+class QueryPlanTestCase(TestCase):
+    def setUp(self):
+        self.host = User(email="host@example.com", username="host@example.com")
+        self.host.save()
+        self.event = Event(
+            host=self.host, start=datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC)
+        )
+        self.event.save()
+        self.participation = Participation.objects.create(
+            event=self.event, user=self.host
+        )
+
+    def assertUsesIndex(self, plan):
+        self.assertEqual(sequential_scans(plan), [], plan)
+
+    def test_detects_sequential_scan(self):
+        plan = Event.objects.filter(tzname="UTC").order_by().explain()
+        self.assertNotEqual(sequential_scans(plan), [])
+
+    def test_queryset_methods(self):
+        querysets = {
+            "upcoming": Event.objects.upcoming(),
+            "to_be_deleted": Event.objects.to_be_deleted(),
+            "with_availability": Event.objects.upcoming().with_availability(),
+            "keyset_page": after(Event.objects.upcoming(), self.event.start, 1),
+            "reminders_due": Reminder.objects.due(),
+        }
+        for name, queryset in querysets.items():
+            with self.subTest(name):
+                self.assertUsesIndex(queryset.explain())
+
+    def test_view_lookups(self):
+        urls = [
+            reverse("arrange_videochat:participate", args=[self.event.pk]),
+            reverse("arrange_videochat:hosted", args=[self.event.pk]),
+            reverse("arrange_videochat:participated", args=[self.event.pk]),
+            reverse("arrange_videochat:delete", args=[self.event.uuid]),
+            reverse("arrange_videochat:leave", args=[self.participation.uuid]),
+        ]
+        for url in urls:
+            with self.subTest(url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+
+                for query in queries:
+                    sql = query["sql"]
+                    if not sql.startswith("SELECT") or "arrange_videochat" not in sql:
+                        continue
+                    with connection.cursor() as cursor:
+                        cursor.execute("EXPLAIN QUERY PLAN " + sql)
+                        plan = "\n".join(row[-1] for row in cursor.fetchall())
+                    self.assertUsesIndex(plan)
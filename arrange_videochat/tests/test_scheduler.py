@@ -0,0 +1,56 @@
+import datetime
+from django.core import mail
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+
+from arrange_videochat.tests import TestCase
+from arrange_videochat.models import Event, MailTemplate
+from arrange_videochat.scheduler import Scheduler
+
+User = get_user_model()
+
+
+class SchedulerTestCase(TestCase):
+    def setUp(self):
+        self.host = User.objects.create(
+            email="host@example.com", username="host@example.com"
+        )
+        MailTemplate(type="join", subject_template="test", body_template="test").save()
+
+    def create_event(self, minutes):
+        return Event.objects.create(
+            host=self.host, start=timezone.now() + datetime.timedelta(minutes=minutes)
+        )
+
+    def test_mails_due_events(self):
+        due = self.create_event(30)
+        later = self.create_event(120)
+        scheduler = Scheduler(poll_interval=5, resync_interval=7200)
+
+        self.assertEqual(scheduler.tick(), 5)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(Event.objects.get(pk=due.pk).mails_sent)
+        self.assertFalse(Event.objects.get(pk=later.pk).mails_sent)
+
+        # sleeps until the next event is due
+        scheduler.poll_interval = 10000
+        self.assertAlmostEqual(scheduler.tick(), 3600, delta=5)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_notices_new_events(self):
+        scheduler = Scheduler()
+        scheduler.tick()
+        self.assertEqual(scheduler.heap, [])
+
+        # the change of the event list is noticed without waiting for a resync
+        event = self.create_event(30)
+        scheduler.tick()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertTrue(Event.objects.get(pk=event.pk).mails_sent)
+
+    def test_resync_interval(self):
+        scheduler = Scheduler(resync_interval=60)
+        now = timezone.now()
+        scheduler.tick(now)
+        self.assertFalse(scheduler.needs_sync(now + datetime.timedelta(seconds=30)))
+        self.assertTrue(scheduler.needs_sync(now + datetime.timedelta(seconds=60)))
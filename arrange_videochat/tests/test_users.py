@@ -0,0 +1,75 @@
+from unittest import mock
+
+from django.test import TransactionTestCase, override_settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.utils import timezone
+
+from arrange_videochat.tests import TestCase
+from arrange_videochat.users import (
+    ORPHAN_GRACE,
+    delete_orphaned_users,
+    resolve_user,
+    user_ids,
+)
+
+User = get_user_model()
+
+
+class ResolveUserTestCase(TestCase):
+    def test_normalize(self):
+        user = resolve_user(" Max@Example.COM ")
+        self.assertEqual(user.username, "max@example.com")
+        self.assertEqual(user.email, "max@example.com")
+        self.assertEqual(resolve_user("max@example.com"), user)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_created_concurrently(self):
+        existing = User.objects.create(username="max@example.com")
+        # the lookup misses the user, which exists once it is created
+        with mock.patch.object(
+            User.objects, "get", side_effect=[User.DoesNotExist, existing]
+        ):
+            self.assertEqual(resolve_user("max@example.com"), existing)
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_not_cached_before_commit(self):
+        with transaction.atomic():
+            resolve_user("max@example.com")
+            self.assertNotIn("max@example.com", user_ids)
+        self.assertIn("max@example.com", user_ids)
+
+    def test_not_cached_after_rollback(self):
+        with self.assertRaises(ValueError), transaction.atomic():
+            resolve_user("max@example.com")
+            raise ValueError
+        self.assertNotIn("max@example.com", user_ids)
+
+
+class UserCacheTestCase(TransactionTestCase):
+    def setUp(self):
+        user_ids.clear()
+        self.addCleanup(user_ids.clear)
+
+    def test_cached(self):
+        user = resolve_user("max@example.com")
+        with self.assertNumQueries(0):
+            cached = resolve_user("MAX@example.com")
+        self.assertEqual(cached.pk, user.pk)
+        self.assertEqual(cached.email, "max@example.com")
+
+    @override_settings(ARRANGE_VIDEOCHAT_USER_CACHE_TIMEOUT=0)
+    def test_expires(self):
+        resolve_user("max@example.com")
+        with self.assertNumQueries(1):
+            resolve_user("max@example.com")
+
+    def test_forget_deleted(self):
+        user = resolve_user("max@example.com")
+        User.objects.filter(pk=user.pk).update(
+            date_joined=timezone.now() - 2 * ORPHAN_GRACE
+        )
+        # the cron job runs in another process
+        self.assertEqual(delete_orphaned_users(), 1)
+        user = resolve_user("max@example.com")
+        self.assertTrue(User.objects.filter(pk=user.pk).exists())
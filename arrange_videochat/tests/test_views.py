@@ -1,17 +1,38 @@
+import time
 import datetime
 import pytz
+from io import StringIO
+from unittest import mock
 
 from django.urls import reverse
-from django.test import TestCase
 from django.contrib.auth import get_user_model
-from django.utils import timezone
+from django.utils import timezone, translation
 from django.core import mail
-
-from arrange_videochat.models import Event, MailTemplate, Participation
+from django.db import connection, transaction
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+
+from arrange_videochat.tests import TestCase
+from arrange_videochat.models import (
+    Event,
+    MailTemplate,
+    OutgoingMail,
+    Participation,
+    mail_templates,
+)
+from arrange_videochat.cache import event_list_key, event_list_version, get_cache
+from arrange_videochat.api import EventListApi
+from arrange_videochat.pagination import keyset_page
+from arrange_videochat.users import user_ids
 
 User = get_user_model()
 
 
+def send_mail_queue():
+    call_command("send_mail_queue", stdout=StringIO())
+
+
 class EventListTestCase(TestCase):
     url = reverse("arrange_videochat:list")
 
@@ -29,7 +50,461 @@ class EventListTestCase(TestCase):
         response = self.client.get(self.url)
         self.assertContains(response, "Upcoming Events", status_code=200)
         # only upcoming events
-        self.assertEqual(response.context["events"].count(), 1)
+        self.assertEqual(len(response.context["events"]), 1)
+
+    def test_constant_number_of_queries(self):
+        def add_events(count):
+            for _ in range(count):
+                event = Event.objects.create(
+                    host=self.host,
+                    start=datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC),
+                )
+                event.participants.add(self.host)
+
+        add_events(2)
+        with CaptureQueriesContext(connection) as few:
+            self.client.get(self.url)
+
+        add_events(10)
+        with CaptureQueriesContext(connection) as many:
+            self.client.get(self.url)
+
+        self.assertEqual(len(few), len(many))
+
+
+class EventListCacheTestCase(TestCase):
+    url = reverse("arrange_videochat:list")
+
+    def setUp(self):
+        self.host = User(email="host@example.com", username="host@example.com")
+        self.host.save()
+        self.event = Event(
+            host=self.host, start=datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC)
+        )
+        self.event.save()
+
+    def list_key(self):
+        return event_list_key(
+            translation.get_language(), timezone.get_current_timezone_name(), ""
+        )
+
+    def test_cached(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertContains(response, "1 participant")
+
+    def test_invalidated_on_join(self):
+        self.client.get(self.url)
+        Participation.objects.reserve(self.event, self.host)
+        response = self.client.get(self.url)
+        self.assertContains(response, "2 participants")
+
+    def test_invalidated_on_new_event(self):
+        self.client.get(self.url)
+        Event(
+            host=self.host, start=datetime.datetime(2222, 6, 1, 20, 0, tzinfo=pytz.UTC)
+        ).save()
+        response = self.client.get(self.url)
+        self.assertEqual(len(response.context["events"]), 2)
+
+    def test_invalidated_on_commit(self):
+        version = event_list_version()
+        with transaction.atomic():
+            Event(
+                host=self.host,
+                start=datetime.datetime(2222, 6, 1, 20, 0, tzinfo=pytz.UTC),
+            ).save()
+            # other workers must not cache the old list under a new version
+            self.assertEqual(event_list_version(), version)
+        self.assertNotEqual(event_list_version(), version)
+
+    def test_expires_at_next_start(self):
+        self.event.start = timezone.now() + datetime.timedelta(seconds=30)
+        self.event.save()
+        self.client.get(self.url)
+
+        key = self.list_key()
+        fresh_for = get_cache().get(key)["fresh_until"] - time.time()
+        self.assertLessEqual(fresh_for, 30)
+
+    def test_single_rebuild(self):
+        key = self.list_key()
+        get_cache().set(
+            key, {"content": b"stale", "content_type": "text/html", "fresh_until": 0}
+        )
+        # another worker is rebuilding the entry
+        get_cache().add(f"{key}:lock", 1)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.content, b"stale")
+
+
+class EventFeedTestCase(TestCase):
+    url = reverse("arrange_videochat:feed")
+
+    def setUp(self):
+        self.host = User(email="host@example.com", username="host@example.com")
+        self.host.save()
+        self.event = Event.objects.create(
+            host=self.host,
+            start=datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC),
+            language="de",
+        )
+        Event.objects.create(
+            host=self.host, start=datetime.datetime(2222, 6, 1, 20, 0, tzinfo=pytz.UTC)
+        )
+        Event.objects.create(
+            host=self.host, start=datetime.datetime(2000, 6, 1, 20, 0, tzinfo=pytz.UTC)
+        )
+
+    def get_feed(self, data=None, **headers):
+        response = self.client.get(self.url, data, **headers)
+        if response.status_code == 200:
+            self.assertTrue(response.streaming)
+            response.text = b"".join(response.streaming_content).decode()
+        return response
+
+    def test_feed(self):
+        response = self.get_feed()
+        self.assertEqual(response["Content-Type"], "text/calendar; charset=utf-8")
+        self.assertTrue(response.text.startswith("BEGIN:VCALENDAR\r\n"))
+        self.assertTrue(response.text.endswith("END:VCALENDAR\r\n"))
+        # upcoming events only
+        self.assertEqual(response.text.count("BEGIN:VEVENT"), 2)
+        self.assertIn(f"UID:{self.event.uuid}@", response.text)
+
+    def test_language_filter(self):
+        response = self.get_feed({"language": "de"})
+        self.assertEqual(response.text.count("BEGIN:VEVENT"), 1)
+        self.assertIn(f"UID:{self.event.uuid}@", response.text)
+
+    def test_conditional_get(self):
+        response = self.get_feed()
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        with self.assertNumQueries(0):
+            response = self.get_feed(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.get_feed(HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, 304)
+
+        # a filtered feed has its own etag
+        response = self.get_feed({"language": "de"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+        Participation.objects.reserve(self.event, self.host)
+        response = self.get_feed(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class ConditionalGetTestCase(TestCase):
+    def setUp(self):
+        self.host = User(email="host@example.com", username="host@example.com")
+        self.host.save()
+        self.event = Event.objects.create(
+            host=self.host, start=timezone.now() + datetime.timedelta(days=1)
+        )
+
+    def assertNotModified(self, url, response):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+        return response
+
+    def assertModified(self, url, response):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list(self):
+        url = reverse("arrange_videochat:list")
+        response = self.client.get(url)
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("max-age=60", response["Cache-Control"])
+        self.assertIn("Accept-Language", response["Vary"])
+        self.assertEqual(response["Surrogate-Key"], "events")
+
+        with self.assertNumQueries(0):
+            not_modified = self.assertNotModified(url, response)
+        self.assertIn("max-age=60", not_modified["Cache-Control"])
+        self.assertIn("Accept-Language", not_modified["Vary"])
+
+        # each language has its own version
+        with translation.override("de"):
+            self.assertModified(url, response)
+
+        Participation.objects.reserve(self.event, self.host)
+        self.assertModified(url, response)
+
+    def assertModifiedAfterStart(self, url):
+        response = self.client.get(url)
+        after_start = self.event.start + datetime.timedelta(minutes=10)
+        with mock.patch("django.utils.timezone.now", return_value=after_start):
+            self.assertModified(url, response)
+            response = self.client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+            )
+            self.assertEqual(response.status_code, 200)
+
+    def test_list_after_start(self):
+        self.assertModifiedAfterStart(reverse("arrange_videochat:list"))
+
+    def test_feed_after_start(self):
+        self.assertModifiedAfterStart(reverse("arrange_videochat:feed"))
+
+    def test_confirmations(self):
+        for name in ("hosted", "participated"):
+            with self.subTest(name):
+                url = reverse(f"arrange_videochat:{name}", args=[self.event.pk])
+                response = self.client.get(url)
+                self.assertIn("public", response["Cache-Control"])
+                self.assertEqual(response["Surrogate-Key"], f"event-{self.event.pk}")
+                self.assertNotModified(url, response)
+
+                user = User.objects.create(username=name, email=f"{name}@example.com")
+                Participation.objects.reserve(self.event, user)
+                self.assertModified(url, response)
+
+    def test_join(self):
+        url = reverse("arrange_videochat:participate", args=[self.event.pk])
+        response = self.client.get(url)
+        self.assertIn("private", response["Cache-Control"])
+        self.assertIn("no-cache", response["Cache-Control"])
+        self.assertNotIn("Surrogate-Key", response)
+        self.assertNotModified(url, response)
+
+        # the page contains the csrf token of the client
+        self.client.cookies.clear()
+        self.assertModified(url, response)
+
+    def test_updated_at(self):
+        updated_at = self.event.updated_at
+        participation = Participation.objects.reserve(self.event, self.host)
+        self.event.refresh_from_db()
+        self.assertGreater(self.event.updated_at, updated_at)
+
+        updated_at = self.event.updated_at
+        participation.delete()
+        self.event.refresh_from_db()
+        self.assertGreater(self.event.updated_at, updated_at)
+
+    def test_past(self):
+        url = reverse("arrange_videochat:participate", args=[self.event.pk])
+        response = self.client.get(url)
+
+        after_start = self.event.start + datetime.timedelta(minutes=1)
+        with mock.patch("django.utils.timezone.now", return_value=after_start):
+            response = self.assertModified(url, response)
+        self.assertContains(response, "already happened")
+
+
+def lookups(queries, table: str) -> list:
+    """the queries selecting from a table"""
+    return [
+        query["sql"]
+        for query in queries
+        if query["sql"].startswith("SELECT") and f'FROM "{table}"' in query["sql"]
+    ]
+
+
+class ObjectLookupTestCase(TestCase):
+    def setUp(self):
+        self.host = User(email="host@example.com", username="host@example.com")
+        self.host.save()
+        self.event = Event.objects.create(
+            host=self.host, start=timezone.now() + datetime.timedelta(days=1)
+        )
+        self.participation = Participation.objects.create(
+            event=self.event,
+            user=User.objects.create(username="p@example.com", email="p@example.com"),
+        )
+        MailTemplate.objects.create(
+            type="join_confirmation", subject_template="test", body_template="test"
+        )
+        MailTemplate.objects.create(
+            type="deleted", subject_template="test", body_template="test"
+        )
+
+    def assertLooksUpOnce(
+        self, method, url, data=None, table="arrange_videochat_event"
+    ):
+        with CaptureQueriesContext(connection) as queries:
+            getattr(self.client, method)(url, data)
+        self.assertEqual(len(lookups(queries, table)), 1, lookups(queries, table))
+
+    def test_get(self):
+        urls = [
+            reverse("arrange_videochat:participate", args=[self.event.pk]),
+            reverse("arrange_videochat:hosted", args=[self.event.pk]),
+            reverse("arrange_videochat:participated", args=[self.event.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url):
+                # the event with its host, shared with the conditional GET
+                with self.assertNumQueries(1):
+                    self.client.get(url)
+
+        url = reverse("arrange_videochat:delete", args=[self.event.uuid])
+        with self.assertNumQueries(1):
+            self.client.get(url)
+
+    def test_join(self):
+        url = reverse("arrange_videochat:participate", args=[self.event.pk])
+        self.assertLooksUpOnce("post", url, {"email": "max@mustermann.com"})
+        # with errors in the form
+        self.assertLooksUpOnce("post", url, {"email": "invalid"})
+
+    def test_delete(self):
+        url = reverse("arrange_videochat:delete", args=[self.event.uuid])
+        self.assertLooksUpOnce("post", url)
+        self.assertFalse(Event.objects.exists())
+
+    def test_leave(self):
+        url = reverse("arrange_videochat:leave", args=[self.participation.uuid])
+        self.assertLooksUpOnce("get", url, table="arrange_videochat_participation")
+        self.assertLooksUpOnce("post", url, table="arrange_videochat_participation")
+        self.assertFalse(Participation.objects.exists())
+
+
+class EventListPaginationTestCase(TestCase):
+    url = reverse("arrange_videochat:list")
+
+    def setUp(self):
+        self.host = User(email="host@example.com", username="host@example.com")
+        self.host.save()
+        # 25 events, all at the same start to exercise the id tie-breaker
+        start = datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC)
+        for i in range(25):
+            Event(host=self.host, start=start, language="de" if i < 5 else "en").save()
+        Event(
+            host=self.host, start=datetime.datetime(2222, 6, 1, 20, 0, tzinfo=pytz.UTC)
+        ).save()
+
+    def test_pages(self):
+        response = self.client.get(self.url)
+        first_page = list(response.context["events"])
+        self.assertEqual(len(first_page), 20)
+
+        response = self.client.get(f"{self.url}?{response.context['next_page_query']}")
+        second_page = list(response.context["events"])
+        self.assertEqual(len(second_page), 6)
+        self.assertNotIn("next_page_query", response.context)
+
+        events = first_page + second_page
+        self.assertEqual(events, list(Event.objects.order_by("start", "pk")))
+
+    def test_filter_language(self):
+        response = self.client.get(self.url, {"language": "de"})
+        self.assertEqual(len(response.context["events"]), 5)
+
+    def test_filter_dates(self):
+        response = self.client.get(
+            self.url, {"date_from": "2222-06-01", "date_to": "2222-06-01"}
+        )
+        self.assertEqual(len(response.context["events"]), 1)
+
+        response = self.client.get(self.url, {"date_to": "2222-05-01"})
+        self.assertEqual(len(response.context["events"]), 20)
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"after": "invalid"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_single_query_per_page(self):
+        with self.assertNumQueries(1):
+            events, cursor = keyset_page(Event.objects.all(), None, 20)
+            self.assertEqual(len(events), 20)
+        # the last page is exactly full
+        with self.assertNumQueries(1):
+            events, cursor = keyset_page(Event.objects.all(), cursor, 6)
+            self.assertEqual(len(events), 6)
+        self.assertIsNone(cursor)
+
+
+class EventApiTestCase(TestCase):
+    url = reverse("arrange_videochat:api_list")
+
+    def setUp(self):
+        self.host = User(email="host@example.com", username="host@example.com")
+        self.host.save()
+        self.event = Event.objects.create(
+            host=self.host,
+            start=datetime.datetime(2222, 5, 1, 20, 0, tzinfo=pytz.UTC),
+            language="de",
+        )
+        Participation.objects.reserve(self.event, self.host)
+        for day in range(2, 5):
+            Event.objects.create(
+                host=self.host,
+                start=datetime.datetime(2222, 5, day, 20, 0, tzinfo=pytz.UTC),
+            )
+        self.past = Event.objects.create(
+            host=self.host, start=datetime.datetime(2000, 5, 1, 20, 0, tzinfo=pytz.UTC)
+        )
+
+    def test_list(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertIn("public", response["Cache-Control"])
+        self.assertIn("max-age=60", response["Cache-Control"])
+
+        data = response.json()
+        self.assertEqual(len(data["events"]), 4)
+        self.assertIsNone(data["next"])
+        self.assertEqual(
+            data["events"][0],
+            {
+                "id": self.event.pk,
+                "start": "2222-05-01T20:00:00+00:00",
+                "language": "de",
+                "timezone": "UTC",
+                "participants": 2,
+                "free_seats": Event.max_participants - 2,
+                "full": False,
+                "participate_url": "https://testserver"
+                + reverse("arrange_videochat:participate", args=[self.event.pk]),
+            },
+        )
+        # the delete url of an event is secret
+        self.assertNotIn(str(self.event.uuid), response.content.decode())
+
+    @mock.patch.object(EventListApi, "page_size", 3)
+    def test_pages(self):
+        data = self.client.get(self.url).json()
+        self.assertEqual(len(data["events"]), 3)
+        second = self.client.get(data["next"]).json()
+        self.assertEqual(len(second["events"]), 1)
+        self.assertIsNone(second["next"])
+
+    def test_filter(self):
+        data = self.client.get(self.url, {"language": "de"}).json()
+        self.assertEqual([event["id"] for event in data["events"]], [self.event.pk])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(self.url, {"after": "invalid"})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("error", response.json())
+
+    def test_cached(self):
+        self.client.get(self.url)
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(len(response.json()["events"]), 4)
+
+        Participation.objects.reserve(self.event, User.objects.create(username="x"))
+        data = self.client.get(self.url).json()
+        self.assertEqual(data["events"][0]["participants"], 3)
+
+    def test_detail(self):
+        url = reverse("arrange_videochat:api_detail", args=[self.event.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.json()["participants"], 2)
+        self.assertIn("max-age=60", response["Cache-Control"])
+
+        url = reverse("arrange_videochat:api_detail", args=[self.past.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 404)
 
 
 class EventHostTestCase(TestCase):
@@ -68,8 +543,11 @@ class EventHostTestCase(TestCase):
         # user was added as host
         self.assertEqual(event.host.email, "max@mustermann.com")
 
-        # email is sent
+        # email is queued and sent outside of the request
+        self.assertEqual(len(mail.outbox), 0)
+        send_mail_queue()
         self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].attachments[0][0], "event.ical")
 
     # TODO: Test for existing user
 
@@ -89,6 +567,7 @@ class EventHostTestCase(TestCase):
                 "tzname": "Europe/Berlin",
             },
         )
+        send_mail_queue()
         # email is sent in language of event (english)
         self.assertEqual(mail.outbox[0].body, "test")
 
@@ -101,6 +580,7 @@ class EventHostTestCase(TestCase):
                 "tzname": "Europe/Berlin",
             },
         )
+        send_mail_queue()
         # email is sent in language of event (german)
         self.assertEqual(mail.outbox[1].body, "german test")
 
@@ -119,6 +599,7 @@ class EventHostTestCase(TestCase):
                 "tzname": "US/Pacific",
             },
         )
+        send_mail_queue()
         self.assertEqual(mail.outbox[0].body, "May 1, 2030, 5 p.m. UTC")
 
     def test_post_past_date(self):
@@ -151,8 +632,32 @@ class EventHostTestCase(TestCase):
         )
         event = Event.objects.get()
 
+        send_mail_queue()
         self.assertEqual(mail.outbox[0].body, event.delete_url)
 
+    def test_can_get_participate_url(self):
+        MailTemplate(
+            type="host_confirmation",
+            subject_template="{{ event.pk }}",
+            body_template="{{ event.participate_url }}",
+        ).save()
+
+        self.client.post(
+            self.url,
+            {
+                "start": self.tomorrow,
+                "email": "max@mustermann.com",
+                "language": "en",
+                "tzname": "Europe/Berlin",
+            },
+        )
+        event = Event.objects.get()
+
+        # the mail is rendered before the event is saved
+        send_mail_queue()
+        self.assertEqual(mail.outbox[0].subject, str(event.pk))
+        self.assertEqual(mail.outbox[0].body, event.participate_url)
+
     def test_timezone(self):
         self.client.post(
             self.url,
@@ -217,16 +722,19 @@ class EventJoinTestCase(TestCase):
         self.assertEqual(self.event.participants.count(), 1)
         self.assertEqual(self.event.participants.get().email, "max@mustermann.com")
 
+        send_mail_queue()
         # email is sent
         self.assertEqual(len(mail.outbox), 1)
 
     def test_post_email_language(self):
         self.client.post(self.url, {"email": "max@mustermann.com"}, follow=True)
+        send_mail_queue()
         # email is sent in language of event (english)
         self.assertEqual(mail.outbox[0].body, "test")
         self.event.language = "de"
         self.event.save()
         self.client.post(self.url, {"email": "max@mustermann.com"}, follow=True)
+        send_mail_queue()
         # email is sent in language of event (german)
         self.assertEqual(mail.outbox[1].body, "german test")
 
@@ -239,6 +747,16 @@ class EventJoinTestCase(TestCase):
         response = self.client.post(url, {"email": "max@mustermann.com",})
         self.assertContains(response, "You can not join", status_code=400)
 
+    def test_post_event_full(self):
+        for i in range(1, 5):
+            email = f"test{i}@example.com"
+            user = User.objects.create(email=email, username=email)
+            Participation.objects.reserve(self.event, user)
+
+        response = self.client.post(self.url, {"email": "max@mustermann.com"})
+        self.assertContains(response, "You can not join", status_code=400)
+        self.assertEqual(self.event.participants.count(), 4)
+
     def test_post_same_user_twice(self):
         """Test that a user is not added twice as participant"""
         self.client.post(self.url, {"email": "max@mustermann.com"})
@@ -255,8 +773,79 @@ class EventJoinTestCase(TestCase):
         )
         participation = Participation.objects.get()
 
+        send_mail_queue()
         self.assertEqual(mail.outbox[0].body, participation.leave_url)
 
+    def test_leave_url_when_joining_twice(self):
+        template = MailTemplate.objects.get()
+        template.body_template = "{{ leave_url }}"
+        template.save()
+
+        self.client.post(self.url, {"email": "max@mustermann.com"})
+        self.client.post(self.url, {"email": "max@mustermann.com"})
+        participation = Participation.objects.get()
+
+        send_mail_queue()
+        self.assertEqual(
+            [message.body for message in mail.outbox], [participation.leave_url] * 2
+        )
+
+    def test_rendered_before_reserving(self):
+        calls = mock.Mock()
+        with mock.patch.object(
+            MailTemplate, "get_mail", wraps=MailTemplate.get_mail
+        ) as get_mail, mock.patch.object(
+            Participation.objects, "reserve", wraps=Participation.objects.reserve
+        ) as reserve:
+            calls.attach_mock(get_mail, "get_mail")
+            calls.attach_mock(reserve, "reserve")
+            self.client.post(self.url, {"email": "max@mustermann.com"})
+        # the event row stays locked from the reservation until the commit
+        self.assertEqual(
+            [call[0] for call in calls.mock_calls], ["get_mail", "reserve"]
+        )
+
+
+class DeletedUserTestCase(TransactionTestCase):
+    """the id of a deleted user may still be remembered, saving with it fails
+    only when the transaction is committed"""
+
+    def setUp(self):
+        get_cache().clear()
+        user_ids.clear()
+        self.addCleanup(user_ids.clear)
+        host = User.objects.create(email="host@example.com", username="host")
+        self.event = Event.objects.create(
+            host=host, start=timezone.now() + datetime.timedelta(days=1)
+        )
+
+    def test_join(self):
+        url = reverse("arrange_videochat:participate", args=[self.event.pk])
+        self.client.post(url, {"email": "max@example.com"})
+        User.objects.get(username="max@example.com").delete()
+
+        response = self.client.post(url, {"email": "max@example.com"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(self.event.participants.get().email, "max@example.com")
+
+    def test_host(self):
+        url = reverse("arrange_videochat:host")
+        data = {
+            "start": datetime.datetime.now() + datetime.timedelta(days=2),
+            "email": "max@example.com",
+            "language": "en",
+            "tzname": "Europe/Berlin",
+        }
+        self.client.post(url, data)
+        User.objects.get(username="max@example.com").delete()
+
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, 302)
+        event = Event.objects.get(host__username="max@example.com")
+        self.assertRedirects(
+            response, reverse("arrange_videochat:hosted", args=[event.pk])
+        )
+
 
 class EventDeleteTestCase(TestCase):
     def setUp(self):
@@ -298,10 +887,39 @@ class EventDeleteTestCase(TestCase):
         # event was deleted
         self.assertEqual(Event.objects.all().count(), 0)
 
+        send_mail_queue()
         # mail sent to participants and host
         self.assertEqual(len(mail.outbox), 2)
         self.assertEqual(mail.outbox[0].to, ["max@mustermann.com"])
 
+    def test_post_queues_mails(self):
+        response = self.client.post(self.url)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(mail.outbox), 0)
+
+        send_mail_queue()
+        self.assertEqual(
+            sorted(message.to[0] for message in mail.outbox),
+            ["host@example.com", "max@mustermann.com"],
+        )
+
+    def test_post_constant_queries(self):
+        def delete(participants):
+            event = Event.objects.create(host=self.host, start=self.tomorrow)
+            for i in range(participants):
+                email = f"{participants}-{i}@example.com"
+                user = User.objects.create(username=email, email=email)
+                Participation.objects.reserve(event, user)
+            url = reverse("arrange_videochat:delete", args=[event.uuid])
+            with CaptureQueriesContext(connection) as queries:
+                self.client.post(url)
+            self.assertFalse(Event.objects.filter(pk=event.pk).exists())
+            return len(queries)
+
+        mail_templates.get("deleted")
+        self.assertEqual(delete(1), delete(Event.max_participants - 1))
+        self.assertEqual(OutgoingMail.objects.count(), 2 + Event.max_participants)
+
 
 class EventLeaveViewTestCase(TestCase):
     def setUp(self):
@@ -336,3 +954,22 @@ class EventLeaveViewTestCase(TestCase):
 
         # Participation was deleted
         self.assertEqual(Participation.objects.all().count(), 0)
+
+
+class EventAdminTestCase(TestCase):
+    def setUp(self):
+        admin = User.objects.create_superuser("admin", "admin@example.com", "password")
+        self.client.force_login(admin)
+        self.event = Event.objects.create(
+            host=admin, start=timezone.now() + datetime.timedelta(days=1)
+        )
+
+    def test_reminders_read_only(self):
+        reminder = self.event.reminders.get()
+        url = reverse("admin:arrange_videochat_event_change", args=[self.event.pk])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, reminder.template_type)
+        # neither an empty form to add reminders nor editable fields
+        self.assertNotContains(response, "reminders-__prefix__")
+        self.assertNotContains(response, 'name="reminders-0-offset"')
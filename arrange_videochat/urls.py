@@ -1,10 +1,13 @@
 from django.urls import path
-from . import views
+from . import views, api
 
 app_name = "arrange_videochat"
 
 urlpatterns = [
     path("", views.EventList.as_view(), name="list"),
+    path("feed.ics", views.EventFeed.as_view(), name="feed"),
+    path("api/events", api.EventListApi.as_view(), name="api_list"),
+    path("api/events/<int:pk>", api.EventDetailApi.as_view(), name="api_detail"),
     path("host", views.EventHost.as_view(), name="host"),
     path("hosted/<int:pk>", views.EventHostConfirmation.as_view(), name="hosted"),
     path("participate/<int:pk>", views.EventJoin.as_view(), name="participate"),
@@ -0,0 +1,131 @@
+import time
+import datetime
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction, IntegrityError
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .cache import users_version, invalidate_users
+from .models import Event, Participation
+
+User = get_user_model()
+
+# user ids by normalized email, until when they may be used and the version of
+# the users they were looked up in
+user_ids = {}
+
+# users that joined recently are kept, they may be about to host or join
+ORPHAN_GRACE = datetime.timedelta(days=1)
+
+
+def cache_timeout() -> int:
+    """seconds a resolved user id is remembered in this process, configurable by
+    settings.ARRANGE_VIDEOCHAT_USER_CACHE_TIMEOUT"""
+    return getattr(settings, "ARRANGE_VIDEOCHAT_USER_CACHE_TIMEOUT", 60)
+
+
+def normalize_email(email: str) -> str:
+    """the form of an email address users are stored by, addresses differing
+    only by case belong to the same user"""
+    return email.strip().lower()
+
+
+def resolve_user(email: str) -> User:
+    """get or create the user of an email address
+
+    The user is looked up by its username, which is the normalized address and
+    unique, so the lookup uses its index. A user created concurrently by another
+    request is fetched instead. Users resolved recently in this process are not
+    looked up again unless users were deleted since, the returned instance then
+    only has its id, username and email set."""
+    email = normalize_email(email)
+    version = users_version()
+    cached = user_ids.get(email)
+    if cached and cached[1] > time.monotonic() and cached[2] == version:
+        user = User(pk=cached[0], username=email, email=email)
+        user._state.adding = False
+        return user
+
+    try:
+        user = User.objects.get(username=email)
+    except User.DoesNotExist:
+        try:
+            with transaction.atomic():
+                user = User.objects.create(username=email, email=email)
+        except IntegrityError:
+            # another request created the user in the meantime
+            user = User.objects.get(username=email)
+
+    # a user created in a transaction that is rolled back must not be cached
+    transaction.on_commit(lambda: remember_user(email, user.pk, version))
+    return user
+
+
+def save_with_user(email: str, save, user: User = None):
+    """call save(user) in a transaction with the user of the email, which is
+    resolved unless given, and return its result
+
+    A remembered id may belong to a user that was deleted since, e.g. in the
+    admin, the transaction then fails with an IntegrityError on commit. All
+    workers forget the users they resolved and save is called once more with
+    the user looked up again."""
+    if user is None:
+        user = resolve_user(email)
+    try:
+        with transaction.atomic():
+            return save(user)
+    except IntegrityError:
+        if User.objects.filter(pk=user.pk).exists():
+            raise
+        invalidate_users()
+
+    user = resolve_user(email)
+    with transaction.atomic():
+        return save(user)
+
+
+def remember_user(email: str, user_id: int, version: str):
+    user_ids[email] = (user_id, time.monotonic() + cache_timeout(), version)
+
+
+def orphaned_users():
+    """users that neither host nor participate in any event, without the ones
+    that may log in (staff, superusers or users that did log in before) and
+    the ones that joined recently"""
+    return User.objects.filter(
+        ~Exists(Event.objects.filter(host=OuterRef("pk"))),
+        ~Exists(Participation.objects.filter(user=OuterRef("pk"))),
+        is_staff=False,
+        is_superuser=False,
+        last_login__isnull=True,
+        date_joined__lt=timezone.now() - ORPHAN_GRACE,
+    )
+
+
+def delete_orphaned_users(batch_size: int = 1000, dry_run=False) -> int:
+    """delete the orphaned users in batches by primary key range
+
+    Each batch is deleted with one query per related table, all workers look up
+    the users they resolved before again once it is committed. Returns the
+    number of (with dry_run: to be) deleted users."""
+    if dry_run:
+        return orphaned_users().count()
+
+    deleted = 0
+    pks = orphaned_users().order_by("pk").values_list("pk", flat=True)
+    last = None
+    while True:
+        chunk = pks if last is None else pks.filter(pk__gt=last)
+        chunk = list(chunk[:batch_size])
+        if not chunk:
+            break
+        last = chunk[-1]
+
+        with transaction.atomic():
+            # the conditions are checked again, a user may have joined an event
+            batch = orphaned_users().filter(pk__range=(chunk[0], last))
+            deleted += batch.delete()[1].get(User._meta.label, 0)
+            transaction.on_commit(invalidate_users)
+    return deleted
@@ -1,28 +1,277 @@
+import math
+import random
+import hashlib
+from functools import wraps
+
 from django.views.generic import (
+    View,
     ListView,
     CreateView,
     DeleteView,
     FormView,
     DetailView,
 )
-from django.contrib.auth import get_user_model
+from django.http import Http404, HttpResponseRedirect, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, render
 from django.urls import reverse
-from django.utils import translation
+from django.utils import translation, timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from django.middleware.csrf import get_token
+from django.conf import settings
+from django.db import transaction
+
+from .models import Event, MailTemplate, OutgoingMail, Participation
+from .forms import Host, Participate, EventFilter
+from .pagination import keyset_page
+from .users import resolve_user, save_with_user
+from .cache import (
+    get_cache,
+    cached_response,
+    event_list_key,
+    event_list_version,
+    event_list_changed_at,
+    first_start_key,
+)
+from . import ical
+
+# stands in for the id of an event while its mail is rendered before it is
+# saved, replaced by the id afterwards
+EVENT_ID_PLACEHOLDER = random.randrange(10 ** 17, 10 ** 18)
+
+
+def max_age() -> int:
+    """seconds clients and proxies may cache public pages, configurable by
+    settings.ARRANGE_VIDEOCHAT_MAX_AGE"""
+    return getattr(settings, "ARRANGE_VIDEOCHAT_MAX_AGE", 60)
+
+
+def http_caching(
+    surrogate_key: str, private=False, vary=("Accept-Language",), **condition_kwargs
+):
+    """answer conditional GETs with the etag and last modified functions of
+    condition() and add the caching headers, also to 304 responses
+
+    surrogate_key is formatted with the url kwargs, a reverse proxy can purge
+    all pages of e.g. one event by it. Private pages are revalidated on every
+    request and not stored by proxies."""
+
+    def decorator(view):
+        view = condition(**condition_kwargs)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = view(request, *args, **kwargs)
+            if response.status_code not in (200, 304):
+                return response
+            if private:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                patch_cache_control(response, public=True, max_age=max_age())
+                response["Surrogate-Key"] = surrogate_key.format(**kwargs)
+            patch_vary_headers(response, vary)
+            return response
+
+        return wrapper
+
+    return decorator
+
+
+def list_first_start(request) -> dict:
+    """the start of the first upcoming event of the filtered list and when it
+    was looked up, the list changes when that event starts
+
+    Kept in the shared cache until the start and memoized for the request."""
+    if "list_first_start" in request.__dict__:
+        return request.list_first_start
+
+    cache = get_cache()
+    key = first_start_key(request.GET.urlencode())
+    entry = cache.get(key)
+    now = timezone.now()
+    if entry is None or (entry["start"] is not None and entry["start"] <= now):
+        events = EventFilter(request.GET).filter(Event.objects.upcoming())
+        start = events.order_by("start").values_list("start", flat=True).first()
+        entry = {"start": start, "looked_up": now}
+        timeout = math.ceil((start - now).total_seconds()) if start else None
+        cache.set(key, entry, timeout)
+    request.list_first_start = entry
+    return entry
+
+
+def list_etag(request, *args, **kwargs):
+    """version of the list in the active language and timezone, until its
+    first event starts"""
+    query = ":".join(
+        [
+            event_list_version(),
+            translation.get_language(),
+            timezone.get_current_timezone_name(),
+            request.GET.urlencode(),
+            str(list_first_start(request)["start"]),
+        ]
+    )
+    return hashlib.md5(query.encode()).hexdigest()
+
+
+def list_last_modified(request, *args, **kwargs):
+    """the last change of the list, or when it was last looked up which event
+    starts first, as the previous one started before"""
+    return max(event_list_changed_at(), list_first_start(request)["looked_up"])
+
+
+def request_object(request, queryset, **lookup):
+    """get_object_or_404() memoized for the request, so the views and their
+    conditional GET functions share a single query"""
+    objects = request.__dict__.setdefault("looked_up_objects", {})
+    key = (queryset.model, tuple(sorted(lookup.items())))
+    if key not in objects:
+        objects[key] = get_object_or_404(queryset, **lookup)
+    return objects[key]
+
+
+class RequestObjectMixin:
+    """Looks up the object of the view once per request, by default the event
+    of the url with its host
+
+    The participant count is read from the seat counter on the event row, so
+    it needs no further query either."""
+
+    queryset = Event.objects.select_related("host")
+    lookup = "pk"
+
+    def get_object(self, queryset=None):
+        return request_object(
+            self.request, self.queryset, **{self.lookup: self.kwargs[self.lookup]}
+        )
+
+
+def event_last_modified(request, pk, *args, **kwargs):
+    """the last change of the event, or its start once it is past as its pages
+    then tell that it already happened"""
+    event = request_object(request, RequestObjectMixin.queryset, pk=pk)
+    if event.is_past:
+        return max(event.updated_at, event.start)
+    return event.updated_at
+
+
+def event_etag(request, pk, *args, **kwargs):
+    last_modified = event_last_modified(request, pk)
+    version = ":".join(
+        [
+            last_modified.isoformat(),
+            translation.get_language(),
+            timezone.get_current_timezone_name(),
+        ]
+    )
+    return hashlib.md5(version.encode()).hexdigest()
+
+
+def event_form_etag(request, pk, *args, **kwargs):
+    """etag of an event page with a form, which depends on the csrf cookie"""
+    etag = event_etag(request, pk)
+    # the token in the page is salted anew on every rendering, the cookie
+    # (which get_token() sets if missing) stays the same
+    get_token(request)
+    csrf_cookie = request.META["CSRF_COOKIE"]
+    return hashlib.md5(f"{etag}:{csrf_cookie}".encode()).hexdigest()
+
+
+@method_decorator(
+    http_caching("events", etag_func=list_etag, last_modified_func=list_last_modified),
+    name="get",
+)
+class EventList(ListView):
+    """Listing of upcoming events
 
-from .models import Event, MailTemplate, Participation
-from .forms import Host, Participate
+    Paginated by a cursor on (start, id) and filterable by language and date"""
 
+    context_object_name = "events"
+    template_name = "arrange_videochat/list.html"
+    page_size = 20
+
+    def get(self, request, *args, **kwargs):
+        key = event_list_key(
+            translation.get_language(),
+            timezone.get_current_timezone_name(),
+            request.GET.urlencode(),
+        )
+        return cached_response(key, lambda: self.render_list(request, *args, **kwargs))
+
+    def render_list(self, request, *args, **kwargs):
+        """render the list and get how long it may be cached, which is until
+        the first event on it starts"""
+        response = super().get(request, *args, **kwargs)
+        response.render()
+
+        timeout = getattr(settings, "ARRANGE_VIDEOCHAT_EVENT_LIST_CACHE_TIMEOUT", 300)
+        events = response.context_data["events"]
+        if events:
+            until_start = (events[0].start - timezone.now()).total_seconds()
+            timeout = min(timeout, int(until_start))
+        return response, timeout
+
+    def get_queryset(self):
+        self.filter_form = EventFilter(self.request.GET)
+        return self.filter_form.filter(Event.objects.upcoming())
+
+    def get_context_data(self, **kwargs):
+        try:
+            events, next_cursor = keyset_page(
+                self.object_list, self.request.GET.get("after"), self.page_size
+            )
+        except ValueError:
+            raise Http404("Invalid page")
+
+        data = super().get_context_data(object_list=events, **kwargs)
+        data["filter_form"] = self.filter_form
+        if next_cursor:
+            query = self.request.GET.copy()
+            query["after"] = next_cursor
+            data["next_page_query"] = query.urlencode()
+        return data
 
-User = get_user_model()
 
+def feed_etag(request, *args, **kwargs):
+    start = list_first_start(request)["start"]
+    query = f"{event_list_version()}:{request.GET.urlencode()}:{start}"
+    return hashlib.md5(query.encode()).hexdigest()
 
-class EventList(ListView):
-    """Listing of upcoming events"""
 
-    context_object_name = "events"
-    template_name = "arrange_videochat/list.html"
-    queryset = Event.objects.upcoming().prefetch_related("participants")
+@method_decorator(
+    http_caching(
+        "events", vary=(), etag_func=feed_etag, last_modified_func=list_last_modified
+    ),
+    name="get",
+)
+class EventFeed(View):
+    """iCalendar feed of upcoming events, filterable like the list
+
+    Streamed event by event, clients polling it get a 304 until an event or
+    participation changes"""
+
+    def get(self, request, *args, **kwargs):
+        events = EventFilter(request.GET).filter(Event.objects.upcoming())
+        response = StreamingHttpResponse(
+            ical.stream(events.iterator()), content_type="text/calendar; charset=utf-8"
+        )
+        response["Content-Disposition"] = 'inline; filename="events.ics"'
+        return response
+
+
+def confirmation_mail(template_type: str, event: Event, email: str, **context):
+    """render a confirmation mail in the language of the event with the event
+    attached as iCalendar file, or None without a template"""
+    with translation.override(event.language):
+        mail = MailTemplate.get_mail(
+            type=template_type, context={"event": event, **context}, to_email=email
+        )
+        if mail:
+            mail.attach(
+                filename="event.ical", content=event.ical, mimetype="text/calendar",
+            )
+    return mail
 
 
 class EventHost(CreateView):
@@ -37,52 +286,75 @@ class EventHost(CreateView):
 
     def form_valid(self, form):
         email = form.cleaned_data["email"]
-        user, _ = User.objects.get_or_create(email=email, username=email)
+        user = resolve_user(email)
         event = form.instance
         event.host = user
-        event.save()
 
-        # send mail
-        with translation.override(event.language):
-            mail = MailTemplate.get_mail(
-                type="host_confirmation", context={"event": event}, to_email=email,
-            )
+        # rendered before the transaction, which then only inserts rows
+        event.pk = EVENT_ID_PLACEHOLDER
+        mail = confirmation_mail("host_confirmation", event, email)
+        if mail:
+            subject, body = mail.subject, mail.body
+
+        def host(user):
+            # inserted again if the first attempt was rolled back
+            event.pk = None
+            event._state.adding = True
+            event.host = user
+            event.save()
             if mail:
-                mail.attach(
-                    filename="event.ical", content=event.ical, mimetype="text/calendar"
-                )
-                mail.send(fail_silently=True)
+                mail.subject = subject.replace(str(EVENT_ID_PLACEHOLDER), str(event.pk))
+                mail.body = body.replace(str(EVENT_ID_PLACEHOLDER), str(event.pk))
+                OutgoingMail.objects.enqueue([mail])
 
+        save_with_user(email, host, user)
         return super().form_valid(form)
 
 
-class EventHostConfirmation(DetailView):
+@method_decorator(
+    http_caching(
+        "event-{pk}", etag_func=event_etag, last_modified_func=event_last_modified
+    ),
+    name="get",
+)
+class EventHostConfirmation(RequestObjectMixin, DetailView):
     """Show a confirmation message for having hosted an event"""
 
-    model = Event
     template_name = "arrange_videochat/hosted.html"
     context_object_name = "event"
 
 
-class EventDeleteView(DeleteView):
+class EventDeleteView(RequestObjectMixin, DeleteView):
     """Allows the host to delete the event."""
 
-    model = Event
+    lookup = "uuid"
     success_url = "/"
     context_object_name = "event"
 
-    def get_object(self):
-        return get_object_or_404(Event, uuid=self.kwargs["uuid"])
-
     def delete(self, request, *args, **kwargs):
-        # mail participants
-        event = self.get_object()
-        event.mail_participants(template_type="deleted")
-
-        return super().delete(request, *args, **kwargs)
-
-
-class EventJoin(FormView):
+        """queue the mails to the participants and delete the event with its
+        participations and reminders in a constant number of queries
+
+        The mails are rendered before deleting and sent by send_mail_queue. The
+        raw delete skips the seat counter updates of every participation."""
+        self.object = self.get_object()
+
+        with transaction.atomic():
+            OutgoingMail.objects.enqueue(self.object.participant_mails("deleted"))
+            Event.objects.filter(pk=self.object.pk).delete_raw()
+        return HttpResponseRedirect(self.get_success_url())
+
+
+@method_decorator(
+    http_caching(
+        "event-{pk}",
+        private=True,
+        etag_func=event_form_etag,
+        last_modified_func=event_last_modified,
+    ),
+    name="get",
+)
+class EventJoin(RequestObjectMixin, FormView):
     """Allows to join the event
 
     Asks user for mail. Sends mail with details for event"""
@@ -93,59 +365,76 @@ class EventJoin(FormView):
     def get_success_url(self):
         return reverse("arrange_videochat:participated", args=[self.get_object().pk])
 
-    def get_object(self):
-        return get_object_or_404(Event, pk=self.kwargs["pk"])
-
     def get_context_data(self, **kwargs):
         data = super().get_context_data(**kwargs)
         data["event"] = self.get_object()
         return data
 
+    def full_or_past(self, event):
+        return render(
+            self.request,
+            "arrange_videochat/full_or_past.html",
+            {"event": event},
+            status=400,
+        )
+
     def form_valid(self, form):
         event = self.get_object()
 
-        if event.is_full or event.is_past:
-            return render(
-                self.request,
-                "arrange_videochat/full_or_past.html",
-                {"event": event},
-                status=400,
-            )
+        if event.is_past:
+            return self.full_or_past(event)
 
         email = form.cleaned_data["email"]
-        user, _ = User.objects.get_or_create(email=email, username=email)
-        participation, _ = Participation.objects.get_or_create(event=event, user=user)
-
-        # send mail
-        with translation.override(event.language):
-            mail = MailTemplate.get_mail(
-                type="join_confirmation",
-                context={"event": event, "leave_url": participation.leave_url},
-                to_email=email,
-            )
-            if mail:
-                mail.attach(
-                    filename="event.ical", content=event.ical, mimetype="text/calendar"
+
+        # rendered before the seat is reserved, which locks the event row until
+        # the transaction is committed
+        participation = Participation(event=event)
+        mail = confirmation_mail(
+            "join_confirmation", event, email, leave_url=participation.leave_url
+        )
+
+        def join(user):
+            reserved = Participation.objects.reserve(event, user, participation.uuid)
+            if reserved is None:
+                return None
+            if reserved.uuid == participation.uuid:
+                OutgoingMail.objects.enqueue([mail])
+            else:
+                # already participating, which is rare enough to render again
+                OutgoingMail.objects.enqueue(
+                    [
+                        confirmation_mail(
+                            "join_confirmation",
+                            event,
+                            email,
+                            leave_url=reserved.leave_url,
+                        )
+                    ]
                 )
-                mail.send(fail_silently=True)
+            return reserved
 
+        if save_with_user(email, join) is None:
+            return self.full_or_past(event)
         return super().form_valid(form)
 
 
-class EventJoinConfirmation(DetailView):
+@method_decorator(
+    http_caching(
+        "event-{pk}", etag_func=event_etag, last_modified_func=event_last_modified
+    ),
+    name="get",
+)
+class EventJoinConfirmation(RequestObjectMixin, DetailView):
     """Show a confirmation message for having joined an event"""
 
-    model = Event
     template_name = "arrange_videochat/participated.html"
     context_object_name = "event"
 
 
-class EventLeaveView(DeleteView):
+class EventLeaveView(RequestObjectMixin, DeleteView):
     """Allows a participant to leave an event, freeing their seat"""
 
-    model = Participation
+    queryset = Participation.objects.select_related("event")
+    lookup = "uuid"
     success_url = "/"
     context_object_name = "participation"
-
-    def get_object(self):
-        return get_object_or_404(Participation, uuid=self.kwargs["uuid"])
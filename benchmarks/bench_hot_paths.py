@@ -0,0 +1,169 @@
+"""Time the hot paths at several scales of seeded test data
+
+Run from the repository root: python benchmarks/bench_hot_paths.py > results.json
+
+Each scale is a number of events with a number of participants each, e.g.
+--scales 100x2 1000x4. Every benchmark runs against a fresh test database with
+the locmem mail backend and reports its median and minimum duration and the
+number of queries of one run as JSON. Pass the results of an earlier run with
+--baseline to fail when a benchmark needs more queries than before.
+"""
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+from io import StringIO
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "example_project")]
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "example_project.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core import mail  # noqa: E402
+from django.core.management import call_command  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.test.utils import (  # noqa: E402
+    CaptureQueriesContext,
+    setup_test_environment,
+    teardown_test_environment,
+)
+from django.urls import reverse  # noqa: E402
+
+from arrange_videochat.cache import get_cache  # noqa: E402
+from arrange_videochat.models import Event, MailTemplate  # noqa: E402
+from arrange_videochat.users import user_ids  # noqa: E402
+
+
+def measure(function, runs: int, setup=None) -> dict:
+    """time runs calls of function, setup is called untimed before each"""
+    durations, queries = [], []
+    for _ in range(runs):
+        argument = setup() if setup else None
+        with CaptureQueriesContext(connection) as captured:
+            started = time.perf_counter()
+            function(argument)
+            durations.append(time.perf_counter() - started)
+        queries.append(len(captured))
+    return {
+        "runs": runs,
+        "median_ms": round(statistics.median(durations) * 1000, 3),
+        "min_ms": round(min(durations) * 1000, 3),
+        "queries": max(queries),
+    }
+
+
+def seed(events: int, participants: int):
+    call_command("flush", interactive=False, verbosity=0)
+    get_cache().clear()
+    # flush deletes the users without signals
+    user_ids.clear()
+    for template_type in ("join", "join_confirmation", "deleted"):
+        MailTemplate.objects.create(
+            type=template_type,
+            subject_template="{{ event }}",
+            body_template="{{ event.join_url }} {{ leave_url }}",
+        )
+    # starting within the hour, so their reminders are due for the cron job
+    call_command(
+        "seed_events",
+        events=events,
+        participants=participants,
+        starts_in=30,
+        stdout=StringIO(),
+    )
+
+
+def bench_scale(events: int, participants: int, runs: int) -> dict:
+    seed(events, participants)
+    client = Client()
+    results = {}
+
+    list_url = reverse("arrange_videochat:list")
+    results["event_list"] = measure(
+        lambda _: client.get(list_url), runs, setup=get_cache().clear
+    )
+    results["event_list_cached"] = measure(lambda _: client.get(list_url), runs)
+
+    first = Event.objects.select_related("host").first()
+    joined = iter(range(runs))
+
+    def free_event():
+        # joining needs a free seat, the seeded events may be full
+        event = Event.objects.create(host=first.host, start=first.start)
+        return reverse("arrange_videochat:participate", args=[event.pk])
+
+    results["event_join"] = measure(
+        lambda url: client.post(url, {"email": f"joiner-{next(joined)}@example.com"}),
+        runs,
+        setup=free_event,
+    )
+
+    results["mail_participants"] = measure(
+        lambda _: first.mail_participants("join"), runs
+    )
+
+    # once, the first run sends all reminders
+    mail.outbox = []
+    results["cron"] = measure(lambda _: call_command("cron", stdout=StringIO()), 1)
+    results["cron"]["mails"] = len(mail.outbox)
+    return results
+
+
+def regressions(results: dict, baseline: dict) -> list:
+    """benchmarks that need more queries than in the baseline"""
+    found = []
+    for scale, benchmarks in results["scales"].items():
+        for name, result in benchmarks.items():
+            before = baseline["scales"].get(scale, {}).get(name)
+            if before and result["queries"] > before["queries"]:
+                found.append(
+                    f"{scale} {name}: {before['queries']} -> {result['queries']} queries"
+                )
+    return found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--scales", nargs="+", default=["10x2", "100x4", "1000x4"])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--baseline", help="JSON results of an earlier run")
+    args = parser.parse_args()
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0)
+    try:
+        results = {
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connection.vendor,
+            "scales": {},
+        }
+        for scale in args.scales:
+            events, participants = (int(part) for part in scale.split("x"))
+            results["scales"][scale] = bench_scale(events, participants, args.runs)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    json.dump(results, sys.stdout, indent=2)
+    print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(results, json.load(f))
+        for regression in found:
+            print(regression, file=sys.stderr)
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compare the iCal serialization of an event with the icalendar library
+
+Run from the repository root: python benchmarks/bench_ical.py
+"""
+
+import os
+import sys
+import timeit
+import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "example_project")]
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "example_project.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from icalendar import Calendar, Event as IEvent  # noqa: E402
+
+from arrange_videochat import ical  # noqa: E402
+from arrange_videochat.models import Event  # noqa: E402
+
+settings.ALLOWED_HOSTS = settings.ALLOWED_HOSTS or ["example.com"]
+
+
+def icalendar_path(event) -> bytes:
+    """the former implementation of Event.ical"""
+    cal = Calendar()
+    vevent = IEvent()
+    vevent.add("summary", "Video Chat")
+    vevent.add("dtstart", event.start)
+    cal.add_component(vevent)
+    return cal.to_ical()
+
+
+def uncached_path(event) -> bytes:
+    ical.vevent.cache_clear()
+    ical.calendar.cache_clear()
+    return ical.serialize(event)
+
+
+def main(number=10000):
+    event = Event(
+        pk=1,
+        start=timezone.now() + datetime.timedelta(days=1),
+        created_at=timezone.now(),
+        tzname="Europe/Berlin",
+        language="en",
+    )
+    for name, function in [
+        ("icalendar", icalendar_path),
+        ("serializer", uncached_path),
+        ("serializer (cached)", ical.serialize),
+    ]:
+        seconds = timeit.timeit(lambda: function(event), number=number)
+        print(f"{name:20} {seconds / number * 1e6:8.1f} µs per event")
+
+
+if __name__ == "__main__":
+    main()